@@ -2,95 +2,220 @@ from crewai import Agent, Task
 from crewai.tools import BaseTool
 from typing import Any
 from pydantic import BaseModel, Field
-from .utils import validate_companies_input, safe_mcp_call, deduplicate_by_key, extract_domain_from_url
+from dataclasses import dataclass, field
+import asyncio
+import re
+from .utils import validate_companies_input, safe_mcp_call, safe_mcp_batch, deduplicate_by_key, extract_domain_from_url
+from .linkedin_cache import LinkedInCache, normalize_cache_key
+
+# Upper bound on in-flight Bright Data MCP calls per discovery run.
+MAX_CONCURRENT_MCP_CALLS = 20
+# Query variants issued for every search term.
+SEARCH_QUERY_SUFFIXES = ("directory", "list", "news")
+
+_TITLE_SEPARATOR_RE = re.compile(r'[\|\-\—\–]')
+_TITLE_SPLIT_RE = re.compile(r'[\|\-\—\–].*$')
+_LEGAL_SUFFIXES = frozenset(
+    ('inc', 'corp', 'llc', 'ltd', 'solutions', 'systems', 'technologies', 'software', 'platform', 'company')
+)
+
+_INDUSTRY_MAPPINGS = {
+    'saas': 'SaaS',
+    'fintech': 'FinTech',
+    'ecommerce': 'E-commerce',
+    'e-commerce': 'E-commerce',
+    'healthcare': 'Healthcare',
+    'ai': 'AI/ML',
+    'machine learning': 'AI/ML',
+    'artificial intelligence': 'AI/ML'
+}
+# Longest keywords first so multi-word industries win over their substrings.
+_INDUSTRY_RE = re.compile(
+    r'\b(' + '|'.join(map(re.escape, sorted(_INDUSTRY_MAPPINGS, key=len, reverse=True))) + r')\b',
+    re.IGNORECASE
+)
+
+@dataclass(slots=True)
+class Company:
+    """A discovered company; converted back to a plain dict when leaving the tool."""
+    name: str
+    domain: str = ''
+    industry: str = 'Technology'
+    employee_count: int = 0
+    icp_score: int = 0
+    linkedin_intelligence: dict = field(default_factory=dict)
+    website_intelligence: dict = field(default_factory=dict)
+    name_lc: str = field(init=False, repr=False)
+    industry_lc: str = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self.name_lc = self.name.lower()
+        self.industry_lc = self.industry.lower()
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'domain': self.domain,
+            'industry': self.industry,
+            '_name_lc': self.name_lc,
+            '_industry_lc': self.industry_lc,
+            'linkedin_intelligence': self.linkedin_intelligence,
+            'website_intelligence': self.website_intelligence,
+            'employee_count': self.employee_count,
+            'icp_score': self.icp_score
+        }
 
 class CompanyDiscoveryInput(BaseModel):
     industry: str = Field(description="Target industry for company discovery")
     size_range: str = Field(description="Company size range (startup, small, medium, enterprise)")
-    location: str = Field(default="", description="Geographic location or region")
+    location: str = Field(default="", description="Geographic location or region; separate several with commas")
 
 class CompanyDiscoveryTool(BaseTool):
     name: str = "discover_companies"
     description: str = "Find companies matching ICP criteria using web scraping"
     args_schema: type[BaseModel] = CompanyDiscoveryInput
     mcp: Any = None
+    cache: Any = None
     
-    def __init__(self, mcp_client):
+    def __init__(self, mcp_client, cache=None):
         super().__init__()
         self.mcp = mcp_client
+        self.cache = cache or LinkedInCache()
     
     def _run(self, industry: str, size_range: str, location: str = "") -> list:
-        companies = []
+        return asyncio.run(self._run_async(industry, size_range, location))
+    
+    async def _run_async(self, industry, size_range, location):
+        industry_lc = industry.lower()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_MCP_CALLS)
         
-        search_terms = [
-            f"{industry} companies {size_range}",
-            f"{industry} startups {location}",
-            f"{industry} technology companies"
-        ]
+        # Each location is its own shard; the location-independent terms are
+        # shared, so they are searched once rather than once per shard.
+        shards = [loc.strip() for loc in location.split(',') if loc.strip()] or [location]
+        search_terms = list(dict.fromkeys(
+            term
+            for shard in shards
+            for term in (
+                f"{industry} companies {size_range}",
+                f"{industry} startups {shard}",
+                f"{industry} technology companies"
+            )
+        ))
         
-        for term in search_terms:
-            results = self._search_companies(term)
-            for company in results:
-                enriched = self._enrich_company_data(company)
-                if self._matches_icp(enriched, industry, size_range):
-                    companies.append(enriched)
+        # Deduplicate before enrichment so each company is scraped only once,
+        # even when several location shards surface it.
+        candidates = deduplicate_by_key(
+            await self._search_companies(search_terms, semaphore),
+            lambda c: normalize_cache_key(c.domain) or c.name_lc
+        )
+        industry_keywords = self._industry_keywords(industry_lc)
+        candidates = [
+            company for company in candidates
+            if self._matches_icp_prelim(company, industry_lc, industry_keywords)
+        ]
         
-        return deduplicate_by_key(companies, lambda c: c.get('domain') or c['name'].lower())
+        enriched_companies = await asyncio.gather(
+            *(self._enrich_company_data(company, semaphore) for company in candidates)
+        )
+        return [
+            company.to_dict() for company in enriched_companies
+            if self._matches_icp(company, industry_lc, size_range)
+        ]
     
-    def _search_companies(self, term):
+    async def _mcp_call(self, semaphore, method_name, *args):
+        """Run a blocking MCP call in a worker thread, bounded by the run's semaphore."""
+        async with semaphore:
+            return await asyncio.to_thread(safe_mcp_call, self.mcp, method_name, *args)
+    
+    async def _search_companies(self, search_terms, semaphore):
         """Search for companies using real web search through Bright Data."""
-        try:
-            companies = []
-            
-            search_queries = [
-                f"{term} directory",
-                f"{term} list",
-                f"{term} news"
-            ]
-            
-            for query in search_queries:
-                try:
-                    results = self._perform_company_search(query)
-                    companies.extend(results)
-                    
-                    if len(companies) >= 10:
-                        break
-                        
-                except Exception as e:
-                    print(f"Error in search query '{query}': {str(e)}")
-                    continue
-            
-            return self._filter_unique_companies(companies)
-            
-        except Exception as e:
-            print(f"Error searching companies for '{term}': {str(e)}")
-            return []
+        queries_by_term = {
+            term: [f"{term} {suffix}" for suffix in SEARCH_QUERY_SUFFIXES]
+            for term in search_terms
+        }
+        search_results = await self._perform_company_searches(
+            [query for queries in queries_by_term.values() for query in queries],
+            semaphore
+        )
+        
+        companies = []
+        for term, queries in queries_by_term.items():
+            term_companies = []
+            for query in queries:
+                search_result = search_results.get(query)
+                if search_result and search_result.get('results'):
+                    term_companies.extend(
+                        self._extract_companies_from_mcp_results(search_result['results'], query)
+                    )
+                else:
+                    print(f"No MCP results for: {query}")
+            companies.extend(self._filter_unique_companies(term_companies))
+        
+        return companies
     
-    def _enrich_company_data(self, company):
-        linkedin_data = safe_mcp_call(self.mcp, 'scrape_company_linkedin', company['name'])
-        website_data = safe_mcp_call(self.mcp, 'scrape_company_website', company.get('domain', ''))
+    async def _enrich_company_data(self, company, semaphore):
+        cache_key = normalize_cache_key(company.domain or company.name)
+        scrapes = (
+            ('linkedin', 'scrape_company_linkedin', company.name),
+            ('website', 'scrape_company_website', company.domain)
+        )
         
-        employee_count = linkedin_data.get('employee_count') or 150
+        # Each scrape is cached under its own row, and only when it returned
+        # data, so a failed scrape is retried on the next run
+        data = {}
+        missing = []
+        for part, method_name, arg in scrapes:
+            cached = self.cache.get(f"{part}:{cache_key}")
+            if cached:
+                data[part] = cached
+            else:
+                missing.append((part, method_name, arg))
         
-        return {
-            **company,
-            'linkedin_intelligence': linkedin_data,
-            'website_intelligence': website_data,
-            'employee_count': employee_count,
-            'icp_score': 0
-        }
+        if missing:
+            fetched = await asyncio.gather(*(
+                self._mcp_call(semaphore, method_name, arg) for _, method_name, arg in missing
+            ))
+            for (part, _, _), result in zip(missing, fetched):
+                data[part] = result
+                if result:
+                    self.cache.set(f"{part}:{cache_key}", result)
+        
+        linkedin_data = data['linkedin']
+        website_data = data['website']
+        company.linkedin_intelligence = linkedin_data
+        company.website_intelligence = website_data
+        company.employee_count = linkedin_data.get('employee_count') or 150
+        company.icp_score = 0
+        
+        return company
+    
+    def _industry_keywords(self, industry_lc):
+        """Keywords that tie a company name to the target industry."""
+        keywords = {token for token in re.split(r'[^a-z0-9]+', industry_lc) if len(token) > 1}
+        keywords.update(
+            keyword for keyword, label in _INDUSTRY_MAPPINGS.items()
+            if label.lower() == industry_lc
+        )
+        return keywords
     
-    def _matches_icp(self, company, industry, size_range):
+    def _matches_icp_prelim(self, company, industry_lc, industry_keywords):
+        """Cheap ICP check on search-result fields, run before paying for enrichment."""
+        if industry_lc in company.industry_lc:
+            return True
+        name = company.name_lc
+        return any(keyword in name for keyword in industry_keywords)
+    
+    def _matches_icp(self, company, industry_lc, size_range):
         score = 0
-        if industry.lower() in company.get('industry', '').lower():
+        if industry_lc in company.industry_lc:
             score += 30
-        if self._check_size_range(company.get('employee_count', 0), size_range):
+        if self._check_size_range(company.employee_count, size_range):
             score += 25
         
-        if company.get('name') and company.get('domain'):
+        if company.name and company.domain:
             score += 20
         
-        company['icp_score'] = score
+        company.icp_score = score
         
         return score >= 20
     
@@ -100,16 +225,12 @@ class CompanyDiscoveryTool(BaseTool):
         return min_size <= count <= max_size
     
     
-    def _perform_company_search(self, query):
-        """Perform company search using Bright Data MCP."""
-        search_result = safe_mcp_call(self.mcp, 'search_company_news', query)
-        
-        if search_result and search_result.get('results'):
-            return self._extract_companies_from_mcp_results(search_result['results'], query)
-        else:
-            print(f"No MCP results for: {query}")
-            return []
-    
+    async def _perform_company_searches(self, queries, semaphore):
+        """Run search queries through a single batched MCP call, reusing cached results."""
+        async with semaphore:
+            return await asyncio.to_thread(
+                safe_mcp_batch, self.mcp, 'search_company_news', queries, MAX_CONCURRENT_MCP_CALLS
+            )
     
     def _filter_unique_companies(self, companies):
         """Filter out duplicate companies."""
@@ -117,7 +238,7 @@ class CompanyDiscoveryTool(BaseTool):
         unique_companies = []
         
         for company in companies:
-            name_key = company.get('name', '').lower()
+            name_key = company.name_lc
             if name_key and name_key not in seen_names:
                 seen_names.add(name_key)
                 unique_companies.append(company)
@@ -127,6 +248,7 @@ class CompanyDiscoveryTool(BaseTool):
     def _extract_companies_from_mcp_results(self, mcp_results, original_query):
         """Extract company information from MCP search results."""
         companies = []
+        industry = self._extract_industry_from_query(original_query)
         
         for result in mcp_results[:10]:
             try:
@@ -139,13 +261,7 @@ class CompanyDiscoveryTool(BaseTool):
                 if company_name and len(company_name) > 2:
                     domain = self._extract_domain_from_url(url)
                     
-                    industry = self._extract_industry_from_query(original_query)
-                    
-                    companies.append({
-                        'name': company_name,
-                        'domain': domain,
-                        'industry': industry
-                    })
+                    companies.append(Company(name=company_name, domain=domain, industry=industry))
                     
             except Exception as e:
                 print(f"Error extracting company from MCP result: {str(e)}")
@@ -155,12 +271,21 @@ class CompanyDiscoveryTool(BaseTool):
     
     def _extract_company_name_from_result(self, title, url):
         """Extract company name from search result title or URL."""
-        import re
-        
-        if title:
-            title_clean = re.sub(r'[\|\-\—\–].*$', '', title).strip()
+        # Titles shorter than 3 characters can never yield a usable name.
+        if title and len(title) > 2:
+            title_clean = title
+            separator = _TITLE_SEPARATOR_RE.search(title_clean)
+            if separator:
+                # Multi-line titles keep the original end-anchored split semantics.
+                if '\n' in title_clean:
+                    title_clean = _TITLE_SPLIT_RE.sub('', title_clean)
+                else:
+                    title_clean = title_clean[:separator.start()]
+            title_clean = title_clean.strip()
             
-            title_clean = re.sub(r'\s+(Inc|Corp|LLC|Ltd|Solutions|Systems|Technologies|Software|Platform|Company)$', '', title_clean, flags=re.IGNORECASE)
+            words = title_clean.rsplit(None, 1)
+            if len(words) == 2 and words[1].lower() in _LEGAL_SUFFIXES:
+                title_clean = words[0]
             
             if len(title_clean) > 2 and len(title_clean) < 50:
                 return title_clean
@@ -178,29 +303,18 @@ class CompanyDiscoveryTool(BaseTool):
     
     def _extract_industry_from_query(self, query):
         """Extract industry from search query."""
-        query_lower = query.lower()
-        
-        industry_mappings = {
-            'saas': 'SaaS',
-            'fintech': 'FinTech', 
-            'ecommerce': 'E-commerce',
-            'healthcare': 'Healthcare',
-            'ai': 'AI/ML',
-            'machine learning': 'AI/ML',
-            'artificial intelligence': 'AI/ML'
-        }
-        
-        for keyword, industry in industry_mappings.items():
-            if keyword in query_lower:
-                return industry
-        
-        return 'Technology'
+        match = _INDUSTRY_RE.search(query)
+        return _INDUSTRY_MAPPINGS[match.group(1).lower()] if match else 'Technology'
+
+AGENT_ROLE = 'Company Discovery Specialist'
+AGENT_GOAL = 'Find high-quality prospects matching ICP criteria'
+AGENT_BACKSTORY = 'Expert at identifying potential customers using real-time web intelligence.'
 
 def create_company_discovery_agent(mcp_client):
     return Agent(
-        role='Company Discovery Specialist',
-        goal='Find high-quality prospects matching ICP criteria',
-        backstory='Expert at identifying potential customers using real-time web intelligence.',
+        role=AGENT_ROLE,
+        goal=AGENT_GOAL,
+        backstory=AGENT_BACKSTORY,
         tools=[CompanyDiscoveryTool(mcp_client)],
         verbose=True
     )
\ No newline at end of file
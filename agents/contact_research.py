@@ -2,9 +2,26 @@ from crewai import Agent, Task
 from crewai.tools import BaseTool
 from typing import Any, List
 from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import heapq
 import re
+import numpy as np
 from .utils import validate_companies_input, safe_mcp_call, validate_email, deduplicate_by_key
 
+MAX_SEARCH_WORKERS = 32
+MAX_CONTACTS_PER_COMPANY = 10
+
+# One pass over the text: a first and last name, or a first name followed by
+# a middle initial and last name. The two-word form comes first so a
+# capitalised job title after a name ("Jane Doe Chief Technology Officer")
+# is not folded into the last name. Possessive quantifiers keep the scan
+# linear: giving back letters or spaces can never produce a different match,
+# so the engine never stores backtrack points.
+_NAME_RE = re.compile(
+    r'\b(?:([A-Z][a-z]++)\s++([A-Z][a-z]++)'
+    r'|([A-Z][a-z]++)\s++([A-Z]\.?+\s*+[A-Z][a-z]++))\b'
+)
+
 class ContactResearchInput(BaseModel):
     companies: List[dict] = Field(description="List of companies to research contacts for")
     target_roles: List[str] = Field(description="List of target roles to find contacts for")
@@ -27,14 +44,17 @@ class ContactResearchTool(BaseTool):
         if not isinstance(target_roles, list):
             target_roles = [target_roles] if target_roles else []
         
-        for company in companies:
-                
+        role_contacts_by_task = self._search_all_contacts(companies, target_roles)
+        
+        for company_idx, company in enumerate(companies):
+            domain = company.get('domain', '')
+            email_suffix = f"@{domain}" if domain else ""
             contacts = []
             
-            for role in target_roles:
-                role_contacts = self._search_contacts_by_role(company, role)
+            for role_idx in range(len(target_roles)):
+                role_contacts = role_contacts_by_task.get((company_idx, role_idx), [])
                 for contact in role_contacts:
-                    enriched = self._enrich_contact_data(contact, company)
+                    enriched = self._enrich_contact_data(contact, email_suffix)
                     if self._validate_contact(enriched):
                         contacts.append(enriched)
             
@@ -43,6 +63,27 @@ class ContactResearchTool(BaseTool):
         
         return companies
     
+    def _search_all_contacts(self, companies, target_roles):
+        """Run every (company, role) search concurrently; results keyed by index pair."""
+        tasks = [(ci, ri) for ci in range(len(companies)) for ri in range(len(target_roles))]
+        if not tasks:
+            return {}
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(MAX_SEARCH_WORKERS, len(tasks))) as executor:
+            futures = {
+                executor.submit(self._search_contacts_by_role, companies[ci], target_roles[ri]): (ci, ri)
+                for ci, ri in tasks
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error searching contacts: {str(e)}")
+                    results[futures[future]] = []
+        
+        return results
+    
     def _search_contacts_by_role(self, company, role):
         """Search for contacts by role using MCP."""
         contacts = []
@@ -97,29 +138,20 @@ class ContactResearchTool(BaseTool):
     
     def _extract_names_from_text(self, text):
         """Extract likely names from text."""
-        import re
-        
-        name_patterns = [
-            r'\b([A-Z][a-z]+)\s+([A-Z][a-z]+)\b',
-            r'\b([A-Z][a-z]+)\s+([A-Z]\.?\s*[A-Z][a-z]+)\b',
-            r'\b([A-Z][a-z]+)\s+([A-Z][a-z]+)\s+([A-Z][a-z]+)\b'
-        ]
-        
         names = []
-        for pattern in name_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                if isinstance(match, tuple):
-                    names.append(list(match))
-                
-        return names[:3]
+        for match in _NAME_RE.finditer(text):
+            names.append([part for part in match.groups() if part is not None])
+            if len(names) >= 3:
+                break
+        
+        return names
     
-    def _enrich_contact_data(self, contact, company):
+    def _enrich_contact_data(self, contact, email_suffix):
         if not contact.get('email'):
             contact['email'] = self._generate_email(
                 contact['first_name'], 
                 contact['last_name'], 
-                company.get('domain', '')
+                email_suffix
             )
         
         contact['email_valid'] = validate_email(contact.get('email', ''))
@@ -128,44 +160,50 @@ class ContactResearchTool(BaseTool):
         
         return contact
     
-    def _generate_email(self, first, last, domain):
-        if not all([first, last, domain]):
+    def _generate_email(self, first, last, email_suffix):
+        """Build first.last plus the company's precomputed '@domain' suffix."""
+        if not (first and last and email_suffix):
             return ""
-        return f"{first.lower()}.{last.lower()}@{domain}"
+        return f"{first.lower()}.{last.lower()}{email_suffix}"
     
     
     def _calculate_confidence(self, contact):
-        score = 0
-        if contact.get('linkedin_url'): score += 30
-        if contact.get('email_valid'): score += 25
-        if contact.get('data_sources', 0) > 1: score += 20
-        if all(contact.get(f) for f in ['first_name', 'last_name', 'title']): score += 25
-        return score
+        # Contacts come from _extract_contacts_from_mcp_results and
+        # _enrich_contact_data, which always set these keys
+        return ((30 if contact['linkedin_url'] else 0) +
+                (25 if contact['email_valid'] else 0) +
+                (20 if contact['data_sources'] > 1 else 0) +
+                (25 if contact['first_name'] and contact['last_name'] and contact['title'] else 0))
     
     def _validate_contact(self, contact):
-        required = ['first_name', 'last_name', 'title']
-        return (all(contact.get(f) for f in required) and 
-                contact.get('confidence_score', 0) >= 50)
+        return bool(contact['first_name'] and contact['last_name'] and contact['title'] and
+                    contact['confidence_score'] >= 50)
     
     def _deduplicate_contacts(self, contacts):
         unique = deduplicate_by_key(
             contacts, 
-            lambda c: c.get('email', '') or f"{c.get('first_name', '')}_{c.get('last_name', '')}"
+            lambda c: c.get('email', '').lower() or f"{c.get('first_name', '')}_{c.get('last_name', '')}"
         )
-        return sorted(unique, key=lambda x: x.get('confidence_score', 0), reverse=True)
+        return heapq.nlargest(MAX_CONTACTS_PER_COMPANY, unique, key=lambda x: x.get('confidence_score', 0))
     
     def _calculate_contact_quality(self, contacts):
         if not contacts:
             return 0
-        avg_confidence = sum(c.get('confidence_score', 0) for c in contacts) / len(contacts)
-        high_quality = sum(1 for c in contacts if c.get('confidence_score', 0) >= 75)
-        return min(avg_confidence + (high_quality * 5), 100)
+        confidence = np.fromiter(
+            (c.get('confidence_score', 0) for c in contacts), dtype=np.int16, count=len(contacts)
+        )
+        high_quality = int(np.count_nonzero(confidence >= 75))
+        return min(float(confidence.mean()) + (high_quality * 5), 100)
+
+AGENT_ROLE = 'Contact Intelligence Specialist'
+AGENT_GOAL = 'Find accurate contact information for decision-makers using MCP'
+AGENT_BACKSTORY = 'Expert at finding and verifying contact information using advanced MCP search tools.'
 
 def create_contact_research_agent(mcp_client):
     return Agent(
-        role='Contact Intelligence Specialist',
-        goal='Find accurate contact information for decision-makers using MCP',
-        backstory='Expert at finding and verifying contact information using advanced MCP search tools.',
+        role=AGENT_ROLE,
+        goal=AGENT_GOAL,
+        backstory=AGENT_BACKSTORY,
         tools=[ContactResearchTool(mcp_client)],
         verbose=True
     )
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Persistent cache for LinkedIn and website enrichment results.
+
+Scraped data is stored in SQLite keyed by the normalized company domain (or
+name when no domain is known), so repeated discovery runs skip Bright Data
+calls for companies that were enriched recently. Callers prefix the key with
+the scrape it holds, so each scrape keeps its own time-to-live.
+"""
+from typing import Dict, Optional
+import logging
+import orjson
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.getenv("LINKEDIN_CACHE_PATH", "linkedin_cache.db")
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_cache_key(value: str) -> str:
+    """Normalize a company domain, URL or name into a stable cache key."""
+    key = (value or "").strip().lower()
+    for prefix in ("https://", "http://"):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    if key.startswith("www."):
+        key = key[4:]
+    return key.rstrip("/")
+
+
+class LinkedInCache:
+    """SQLite-backed enrichment cache with a time-to-live on every entry."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS linkedin_cache (
+                    normalized_url TEXT PRIMARY KEY,
+                    raw_data TEXT NOT NULL,
+                    scraped_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_linkedin_cache_scraped_at ON linkedin_cache (scraped_at)"
+            )
+            # Expired rows are never served again, so drop them instead of
+            # letting the file grow with every run
+            self._conn.execute(
+                "DELETE FROM linkedin_cache WHERE scraped_at <= ?",
+                (time.time() - self.ttl_seconds,)
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return cached data for key, or None when missing or expired."""
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT raw_data FROM linkedin_cache WHERE normalized_url = ? AND scraped_at > ?",
+                    (key, cutoff)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("LinkedIn cache read failed for %s: %s", key, e)
+            return None
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, data: Dict) -> None:
+        """Store data for key, replacing any previous entry and dropping expired ones."""
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO linkedin_cache (normalized_url, raw_data, scraped_at) VALUES (?, ?, ?)",
+                    (key, orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8'), now)
+                )
+                self._conn.execute(
+                    "DELETE FROM linkedin_cache WHERE scraped_at <= ?",
+                    (now - self.ttl_seconds,)
+                )
+        except sqlite3.Error as e:
+            logger.warning("LinkedIn cache write failed for %s: %s", key, e)
@@ -2,24 +2,117 @@ from crewai import Agent, Task
 from crewai.tools import BaseTool
 from typing import Any, List
 from pydantic import BaseModel, Field
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import httpx
 import openai
 import os
+import re
+import threading
+import time
+from .utils import precompute_company_stats
+
+MAX_CONCURRENT_OPENAI_CALLS = 10
+# Retries per completion on 429/5xx/timeouts, with the client's exponential backoff
+OPENAI_MAX_RETRIES = 3
+OPENAI_MAX_CONNECTIONS = 50
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Every tool call shares one AsyncOpenAI client, so its connection pool (and
+# the concurrency bound) spans the whole process. An async client is tied to
+# the event loop it runs on, so the client lives on a dedicated loop thread
+# and tool calls submit their coroutines to it.
+_openai_loop = None
+_openai_client = None
+_openai_semaphore = None
+_openai_lock = threading.Lock()
+MESSAGE_MODEL = "gpt-4"
+
+# Completions are reused only for byte-identical prompts (same contact,
+# company and trigger context), e.g. when a run is repeated; near-matches
+# would put one contact's name and details into another's message. Runs with
+# use_cache=False always sample a fresh completion, which then replaces the
+# cached one.
+MESSAGE_CACHE_TTL_SECONDS = 24 * 60 * 60
+MESSAGE_CACHE_MAX_ENTRIES = 2048
+_message_cache: OrderedDict = OrderedDict()
+_message_cache_lock = threading.Lock()
+
+# Static instructions go first as the system message so the identical prefix
+# is shared (and prompt-cached) across every contact in a batch; only the
+# short per-contact part below is filled in per request.
+COLD_EMAIL_SYSTEM_PROMPT = """You write personalized cold emails.
+
+Requirements:
+- Subject line that references the trigger event
+- Personal greeting with first name
+- Opening that demonstrates research
+- Brief value proposition
+- Clear call-to-action
+- Maximum 120 words
+
+Format as:
+SUBJECT: [subject line]
+BODY: [email body]"""
+
+COLD_EMAIL_USER_TEMPLATE = """Write a personalized cold email:
+
+Contact: {contact_name}, {contact_title} at {company_name}
+Industry: {industry}
+Context: {trigger_text}"""
+
+LINKEDIN_SYSTEM_PROMPT = """Write a LinkedIn connection request (max 300 chars).
+
+Be professional, reference their company activity, no direct sales pitch."""
+
+LINKEDIN_USER_TEMPLATE = """Contact: {contact_name} at {company_name}
+Context: {trigger_description}"""
+
+_EMAIL_RESPONSE_RE = re.compile(r'^\s*SUBJECT:(?P<subject>[^\n]*)(?:.*?^\s*BODY:(?P<body>.*))?', re.M | re.S)
+_EMAIL_BODY_RE = re.compile(r'^\s*BODY:(?P<body>.*)', re.M | re.S)
+
+@lru_cache(maxsize=1024)
+def _trigger_type_pattern(trigger_types):
+    """One compiled alternation per distinct set of trigger types, so a body is scanned once."""
+    if not trigger_types:
+        return None
+    return re.compile('|'.join(map(re.escape, trigger_types)))
+
+def _get_openai_loop():
+    """Start the shared OpenAI client and its event loop thread on first use."""
+    global _openai_loop, _openai_client, _openai_semaphore
+    with _openai_lock:
+        if _openai_loop is None:
+            _openai_client = openai.AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(
+                    timeout=60.0,
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+                    )
+                )
+            )
+            _openai_semaphore = asyncio.Semaphore(MAX_CONCURRENT_OPENAI_CALLS)
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="openai-client-loop", daemon=True).start()
+            _openai_loop = loop
+        return _openai_loop
 
 class MessageGenerationInput(BaseModel):
     companies: List[dict] = Field(description="List of companies with contacts to generate messages for")
     message_type: str = Field(default="cold_email", description="Type of message to generate (cold_email, linkedin_message, follow_up)")
+    message_types: List[str] = Field(default_factory=list, description="Several message types to generate per contact; overrides message_type when given")
+    use_cache: bool = Field(default=True, description="Reuse messages generated earlier for identical prompts; False always generates fresh ones")
 
 class MessageGenerationTool(BaseTool):
     name: str = "generate_messages"
     description: str = "Create personalized outreach based on company intelligence"
     args_schema: type[BaseModel] = MessageGenerationInput
-    client: Any = None
     
-    def __init__(self):
-        super().__init__()
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
-    def _run(self, companies, message_type="cold_email") -> list:
+    def _run(self, companies, message_type="cold_email", message_types=None, use_cache=True) -> list:
         # Ensure companies is a list
         if not isinstance(companies, list):
             print(f"Warning: Expected list of companies, got {type(companies)}")
@@ -29,29 +122,54 @@ class MessageGenerationTool(BaseTool):
             print("No companies provided for message generation")
             return []
         
+        return asyncio.run_coroutine_threadsafe(
+            self._run_async(companies, list(message_types or [message_type]), use_cache),
+            _get_openai_loop()
+        ).result()
+    
+    async def _run_async(self, companies, message_types, use_cache=True):
+        targets = []
         for company in companies:
             if not isinstance(company, dict):
                 print(f"Warning: Expected company dict, got {type(company)}")
                 continue
-                
+            
+            precompute_company_stats(company)
+            if '_name_lc' not in company:
+                company['_name_lc'] = company.get('name', '').lower()
             for contact in company.get('contacts', []):
                 if not isinstance(contact, dict):
                     continue
-                    
-                message = self._generate_personalized_message(contact, company, message_type)
+                contact['generated_messages'] = {}
+                for message_type in message_types:
+                    targets.append((contact, company, message_type))
+        
+        messages = await asyncio.gather(
+            *(self._generate_personalized_message(_openai_client, _openai_semaphore, contact, company, message_type, use_cache)
+              for contact, company, message_type in targets),
+            return_exceptions=True
+        )
+        
+        for (contact, company, message_type), message in zip(targets, messages):
+            if isinstance(message, Exception):
+                print(f"Error generating {message_type} for {company.get('name', '')}: {str(message)}")
+                message = {'subject': '', 'body': ''}
+            contact['generated_messages'][message_type] = message
+            if message_type == message_types[0]:
                 contact['generated_message'] = message
                 contact['message_quality_score'] = self._calculate_message_quality(message, company)
         return companies
     
-    def _generate_personalized_message(self, contact, company, message_type):
+    async def _generate_personalized_message(self, client, semaphore, contact, company, message_type, use_cache=True):
         context = self._build_message_context(contact, company)
         
-        if message_type == "cold_email":
-            return self._generate_cold_email(context)
-        elif message_type == "linkedin_message":
-            return self._generate_linkedin_message(context)
-        else:
-            return self._generate_cold_email(context)
+        async with semaphore:
+            if message_type == "cold_email":
+                return await self._generate_cold_email(client, context, use_cache)
+            elif message_type == "linkedin_message":
+                return await self._generate_linkedin_message(client, context, use_cache)
+            else:
+                return await self._generate_cold_email(client, context, use_cache)
     
     def _build_message_context(self, contact, company):
         triggers = company.get('trigger_events', [])
@@ -66,83 +184,76 @@ class MessageGenerationTool(BaseTool):
             'trigger_count': len(triggers)
         }
     
-    def _generate_cold_email(self, context):
+    async def _generate_cold_email(self, client, context, use_cache=True):
         trigger_text = ""
         if context['primary_trigger']:
             trigger_text = f"I noticed {context['company_name']} {context['primary_trigger']['description'].lower()}."
         
-        prompt = f"""Write a personalized cold email:
+        prompt = COLD_EMAIL_USER_TEMPLATE.format_map(dict(context, trigger_text=trigger_text))
 
-Contact: {context['contact_name']}, {context['contact_title']} at {context['company_name']}
-Industry: {context['industry']}
-Context: {trigger_text}
-
-Requirements:
-- Subject line that references the trigger event
-- Personal greeting with first name
-- Opening that demonstrates research
-- Brief value proposition
-- Clear call-to-action
-- Maximum 120 words
-
-Format as:
-SUBJECT: [subject line]
-BODY: [email body]"""
-
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=300
-        )
-        
-        return self._parse_email_response(response.choices[0].message.content)
+        content = await self._complete(client, COLD_EMAIL_SYSTEM_PROMPT, prompt, max_tokens=300, use_cache=use_cache)
+        return self._parse_email_response(content)
     
-    def _generate_linkedin_message(self, context):
-        prompt = f"""Write a LinkedIn connection request (max 300 chars):
-
-Contact: {context['contact_name']} at {context['company_name']}
-Context: {context.get('primary_trigger', {}).get('description', '')}
-
-Be professional, reference their company activity, no direct sales pitch."""
+    async def _generate_linkedin_message(self, client, context, use_cache=True):
+        trigger_description = (context['primary_trigger'] or {}).get('description', '')
+        prompt = LINKEDIN_USER_TEMPLATE.format_map(dict(context, trigger_description=trigger_description))
 
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=100
-        )
-        
+        content = await self._complete(client, LINKEDIN_SYSTEM_PROMPT, prompt, max_tokens=100, use_cache=use_cache)
         return {
             'subject': 'LinkedIn Connection Request',
-            'body': response.choices[0].message.content.strip()
+            'body': content.strip()
         }
     
-    def _parse_email_response(self, response):
-        lines = response.strip().split('\n')
-        subject = ""
-        body_lines = []
+    async def _complete(self, client, system_prompt, prompt, max_tokens, use_cache=True):
+        """Chat completion content for the prompt, served from the message cache when use_cache allows."""
+        key = (MESSAGE_MODEL, system_prompt, prompt, max_tokens)
+        if use_cache:
+            with _message_cache_lock:
+                entry = _message_cache.get(key)
+                if entry and time.monotonic() - entry[0] < MESSAGE_CACHE_TTL_SECONDS:
+                    _message_cache.move_to_end(key)
+                    return entry[1]
         
-        for line in lines:
-            if line.startswith('SUBJECT:'):
-                subject = line.replace('SUBJECT:', '').strip()
-            elif line.startswith('BODY:'):
-                body_lines.append(line.replace('BODY:', '').strip())
-            elif body_lines:
-                body_lines.append(line)
+        response = await client.chat.completions.create(
+            model=MESSAGE_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=max_tokens
+        )
+        content = response.choices[0].message.content
+        
+        with _message_cache_lock:
+            _message_cache[key] = (time.monotonic(), content)
+            _message_cache.move_to_end(key)
+            while len(_message_cache) > MESSAGE_CACHE_MAX_ENTRIES:
+                _message_cache.popitem(last=False)
+        return content
+    
+    def _parse_email_response(self, response):
+        match = _EMAIL_RESPONSE_RE.search(response)
+        if not match:
+            body_match = _EMAIL_BODY_RE.search(response)
+            if body_match:
+                return {'subject': '', 'body': body_match['body'].strip()}
+            # Model ignored the SUBJECT/BODY format; keep its output as the body
+            return {'subject': '', 'body': response.strip()}
         
         return {
-            'subject': subject,
-            'body': '\n'.join(body_lines).strip()
+            'subject': match['subject'].strip(),
+            'body': (match['body'] or '').strip()
         }
     
     def _calculate_message_quality(self, message, company):
         score = 0
         body = message.get('body', '').lower()
         
-        if company.get('name', '').lower() in message.get('subject', '').lower():
+        if company['_name_lc'] in message.get('subject', '').lower():
             score += 25
-        if company.get('trigger_events') and any(t.get('type', '') in body for t in company['trigger_events']):
+        trigger_pattern = _trigger_type_pattern(company['_trigger_types'])
+        if trigger_pattern and trigger_pattern.search(body):
             score += 30
         if len(body.split()) <= 120:
             score += 20
@@ -151,11 +262,15 @@ Be professional, reference their company activity, no direct sales pitch."""
         
         return score
 
+AGENT_ROLE = 'Personalization Specialist'
+AGENT_GOAL = 'Create compelling personalized outreach that gets responses'
+AGENT_BACKSTORY = 'Expert at crafting messages that demonstrate research and provide value.'
+
 def create_message_generation_agent():
     return Agent(
-        role='Personalization Specialist',
-        goal='Create compelling personalized outreach that gets responses',
-        backstory='Expert at crafting messages that demonstrate research and provide value.',
+        role=AGENT_ROLE,
+        goal=AGENT_GOAL,
+        backstory=AGENT_BACKSTORY,
         tools=[MessageGenerationTool()],
         verbose=True
     )
\ No newline at end of file
@@ -1,11 +1,37 @@
 from crewai import Agent, Task
 from crewai.tools import BaseTool
 from datetime import datetime
-from typing import List
+from typing import Any, List
 from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import requests
 import os
-from .utils import validate_companies_input
+from .utils import validate_companies_input, precompute_company_stats
+
+HUBSPOT_BATCH_SIZE = 100
+# Requests kept in flight by the batch stage, then by the single-create stage
+# that follows it; the stages never overlap, and 429s from HubSpot's 100
+# requests per 10 seconds limit are retried with backoff by the session
+MAX_BATCH_WORKERS = 4
+MAX_SINGLE_CREATE_WORKERS = 10
+
+LEAD_SCORE_DEFAULTS = {
+    'icp_score': 0,
+    'trigger_score': 0,
+    'contact_score': 0,
+    'employee_count': 0
+}
+
+# Feature columns: icp, trigger, contact, high-severity triggers (timing),
+# has triggers and more than 50 employees (the two health points)
+LEAD_SCORE_WEIGHTS = np.array([0.3, 2, 0.2, 8, 5, 5])
+LEAD_SCORE_CAPS = np.array([25, 30, 20, 15, np.inf, np.inf])
+LEAD_GRADE_THRESHOLDS = np.array([50, 65, 80])
+LEAD_GRADES = np.array(['D', 'C', 'B', 'A'])
 
 class LeadScoringInput(BaseModel):
     companies: List[dict] = Field(description="List of companies to score")
@@ -21,57 +47,62 @@ class LeadScoringTool(BaseTool):
             return []
         
         for company in companies:
-                
-            score_breakdown = self._calculate_lead_score(company)
-            company['lead_score'] = score_breakdown['total_score']
-            company['score_breakdown'] = score_breakdown
-            company['lead_grade'] = self._assign_grade(score_breakdown['total_score'])
+            for key, default in LEAD_SCORE_DEFAULTS.items():
+                company.setdefault(key, default)
+            precompute_company_stats(company)
         
-        return sorted(companies, key=lambda x: x.get('lead_score', 0), reverse=True)
+        totals = self._score_companies(companies)
+        # Stable on the negated scores, so ties keep their input order
+        return [companies[i] for i in np.argsort(-totals, kind='stable')]
     
-    def _calculate_lead_score(self, company):
-        breakdown = {
-            'icp_score': min(company.get('icp_score', 0) * 0.3, 25),
-            'trigger_score': min(company.get('trigger_score', 0) * 2, 30),
-            'contact_score': min(company.get('contact_score', 0) * 0.2, 20),
-            'timing_score': self._assess_timing(company),
-            'company_health': self._assess_health(company)
-        }
-        breakdown['total_score'] = sum(breakdown.values())
-        return breakdown
-    
-    def _assess_timing(self, company):
-        triggers = company.get('trigger_events', [])
-        if not triggers:
-            return 0
+    def _score_companies(self, companies):
+        """Score and grade all companies in one vectorized pass; returns the total scores."""
+        features = np.array([
+            [c['icp_score'], c['trigger_score'], c['contact_score'], c['_recent_high_triggers'],
+             bool(c['_trigger_types']), c['employee_count'] > 50]
+            for c in companies
+        ], dtype=np.float64)
+        scores = np.minimum(features * LEAD_SCORE_WEIGHTS, LEAD_SCORE_CAPS)
+        totals = scores.sum(axis=1)
+        grades = LEAD_GRADES[np.digitize(totals, LEAD_GRADE_THRESHOLDS)]
         
-        recent_triggers = sum(1 for t in triggers if 'high' in t.get('severity', ''))
-        return min(recent_triggers * 8, 15)
-    
-    def _assess_health(self, company):
-        score = 0
-        if company.get('trigger_events'):
-            score += 5
-        if company.get('employee_count', 0) > 50:
-            score += 5
-        return score
-    
-    def _assign_grade(self, score):
-        if score >= 80: return 'A'
-        elif score >= 65: return 'B' 
-        elif score >= 50: return 'C'
-        else: return 'D'
+        for company, row, total, grade in zip(companies, scores.tolist(), totals.tolist(), grades.tolist()):
+            company['lead_score'] = total
+            company['score_breakdown'] = {
+                'icp_score': row[0],
+                'trigger_score': row[1],
+                'contact_score': row[2],
+                'timing_score': row[3],
+                'company_health': row[4] + row[5],
+                'total_score': total
+            }
+            company['lead_grade'] = grade
+        return totals
 
 class CRMIntegrationInput(BaseModel):
     companies: List[dict] = Field(description="List of companies to export to CRM")
     min_grade: str = Field(default="B", description="Minimum lead grade to export (A, B, C, D)")
+    exclude_emails: List[str] = Field(default_factory=list, description="Lowercased emails already exported, skipped without a request")
 
 class CRMIntegrationTool(BaseTool):
     name: str = "crm_integration"
     description: str = "Export qualified leads to HubSpot CRM"
     args_schema: type[BaseModel] = CRMIntegrationInput
+    session: Any = None
+    
+    def __init__(self):
+        super().__init__()
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"})
+        )
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retry))
     
-    def _run(self, companies, min_grade='B') -> dict:
+    def _run(self, companies, min_grade='B', exclude_emails=None) -> dict:
         companies = validate_companies_input(companies)
         if not companies:
             return {"message": "No companies provided for CRM export", "success": 0, "errors": 0}
@@ -82,32 +113,48 @@ class CRMIntegrationTool(BaseTool):
             return {"error": "HubSpot API key not configured", "success": 0, "errors": 0}
         
         results = {"success": 0, "errors": 0, "details": []}
+        pending = []
+        run_ts = datetime.now().isoformat()
+        exclude_emails = set(exclude_emails or ())
         
         for company in qualified:
             for contact in company.get('contacts', []):
                 if not isinstance(contact, dict):
                     continue
-                    
-                result = self._create_hubspot_contact(contact, company)
-                if result.get('success'):
-                    results['success'] += 1
-                else:
-                    results['errors'] += 1
-                results['details'].append(result)
+                
+                properties = self._build_contact_properties(contact, company, run_ts)
+                if properties is None:
+                    results['details'].append(self._missing_email_result(contact))
+                elif properties['email'].lower() not in exclude_emails:
+                    pending.append((contact, company, properties))
+        
+        results['requested'] = len(pending)
+        pending_iter = iter(pending)
+        chunks = list(iter(lambda: list(islice(pending_iter, HUBSPOT_BATCH_SIZE)), []))
+        retry = []
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(MAX_BATCH_WORKERS, len(chunks))) as executor:
+                for chunk_results, chunk_retry in executor.map(self._create_hubspot_contacts_batch, chunks):
+                    results['details'].extend(chunk_results)
+                    retry.extend(chunk_retry)
+        
+        if retry:
+            with ThreadPoolExecutor(max_workers=min(MAX_SINGLE_CREATE_WORKERS, len(retry))) as executor:
+                results['details'].extend(executor.map(lambda pair: self._create_hubspot_contact(*pair, run_ts), retry))
+        
+        for result in results['details']:
+            if result.get('success'):
+                results['success'] += 1
+            else:
+                results['errors'] += 1
         
         return results
     
-    def _create_hubspot_contact(self, contact, company):
-        api_key = os.getenv("HUBSPOT_API_KEY")
-        if not api_key:
-            return {"success": False, "error": "HubSpot API key not configured"}
-            
-        url = "https://api.hubapi.com/crm/v3/objects/contacts"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
+    def _missing_email_result(self, contact):
+        return {"success": False, "error": "Contact email is required", "contact": contact.get('first_name', 'Unknown')}
+    
+    def _build_contact_properties(self, contact, company, run_ts):
+        """Build HubSpot contact properties, or None when the contact has no email."""
         trigger_summary = "; ".join([
             f"{t.get('type', '')}: {t.get('description', '')}" 
             for t in company.get('trigger_events', [])
@@ -115,7 +162,7 @@ class CRMIntegrationTool(BaseTool):
         
         email = contact.get('email', '').strip()
         if not email:
-            return {"success": False, "error": "Contact email is required", "contact": contact.get('first_name', 'Unknown')}
+            return None
         
         properties = {
             "email": email,
@@ -137,15 +184,124 @@ class CRMIntegrationTool(BaseTool):
         if contact.get('confidence_score'):
             properties["contact_confidence"] = str(contact.get('confidence_score', 0))
         
-        properties["ai_discovery_date"] = datetime.now().isoformat()
+        properties["ai_discovery_date"] = run_ts
+        return properties
+    
+    def _create_hubspot_contacts_batch(self, pending):
+        """Create up to HUBSPOT_BATCH_SIZE contacts in one request.
+        
+        HubSpot's batch create is all-or-nothing, so emails HubSpot already
+        has are looked up first and reported as existing contacts, and only
+        the rest go into the create call. Returns (results, retry), where
+        retry holds the (contact, company) pairs the batch call did not
+        create (partial failures, network errors) for the caller to create
+        one by one.
+        """
+        api_key = os.getenv("HUBSPOT_API_KEY")
+        url = "https://api.hubapi.com/crm/v3/objects/contacts/batch/create"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        
+        existing = self._read_existing_contacts([properties['email'] for _, _, properties in pending], headers)
+        results = []
+        to_create = []
+        for contact, company, properties in pending:
+            hubspot_id = existing.get(properties['email'].lower())
+            if hubspot_id:
+                results.append({
+                    "success": True,
+                    "contact": contact.get('first_name', ''),
+                    "email": properties['email'],
+                    "company": company.get('name', ''),
+                    "hubspot_id": hubspot_id,
+                    "note": "Contact already exists"
+                })
+            else:
+                to_create.append((contact, company, properties))
+        
+        created = {}
+        if to_create:
+            # The session retries POSTs on 5xx, so a batch whose first attempt
+            # succeeded server-side can be replayed and come back 409; its
+            # contacts then go through single creates, which report them as
+            # existing contacts
+            try:
+                response = self.session.post(
+                    url,
+                    json={"inputs": [{"properties": properties} for _, _, properties in to_create]},
+                    headers=headers,
+                    timeout=30
+                )
+                if response.status_code in (200, 201, 207):
+                    for record in response.json().get('results', []):
+                        email = record.get('properties', {}).get('email') or ''
+                        created[email.lower()] = record.get('id')
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Warning: HubSpot batch create failed, falling back to single creates: {str(e)}")
+        
+        retry = []
+        for contact, company, properties in to_create:
+            hubspot_id = created.get(properties['email'].lower())
+            if hubspot_id:
+                results.append({
+                    "success": True,
+                    "contact": contact.get('first_name', ''),
+                    "email": properties['email'],
+                    "company": company.get('name', ''),
+                    "hubspot_id": hubspot_id
+                })
+            else:
+                retry.append((contact, company))
+        return results, retry
+    
+    def _read_existing_contacts(self, emails, headers):
+        """Map the lowercased emails HubSpot already has to their contact ids.
+        
+        A failed lookup returns an empty map, leaving existing emails to the
+        create path's 409 handling.
+        """
+        url = "https://api.hubapi.com/crm/v3/objects/contacts/batch/read"
+        try:
+            response = self.session.post(
+                url,
+                json={
+                    "idProperty": "email",
+                    "properties": ["email"],
+                    "inputs": [{"id": email} for email in emails]
+                },
+                headers=headers,
+                timeout=30
+            )
+            if response.status_code not in (200, 207):
+                return {}
+            existing = {}
+            for record in response.json().get('results', []):
+                email = record.get('properties', {}).get('email') or ''
+                existing[email.lower()] = record.get('id')
+            return existing
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Warning: HubSpot contact lookup failed: {str(e)}")
+            return {}
+    
+    def _create_hubspot_contact(self, contact, company, run_ts=None):
+        api_key = os.getenv("HUBSPOT_API_KEY")
+        if not api_key:
+            return {"success": False, "error": "HubSpot API key not configured"}
+            
+        url = "https://api.hubapi.com/crm/v3/objects/contacts"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        
+        properties = self._build_contact_properties(contact, company, run_ts or datetime.now().isoformat())
+        if properties is None:
+            return self._missing_email_result(contact)
         
         try:
-            response = requests.post(url, json={"properties": properties}, headers=headers, timeout=30)
+            response = self.session.post(url, json={"properties": properties}, headers=headers, timeout=30)
             
             if response.status_code == 201:
                 return {
                     "success": True,
                     "contact": contact.get('first_name', ''),
+                    "email": properties['email'],
                     "company": company.get('name', ''),
                     "hubspot_id": response.json().get('id')
                 }
@@ -154,6 +310,7 @@ class CRMIntegrationTool(BaseTool):
                 return {
                     "success": True,
                     "contact": contact.get('first_name', ''),
+                    "email": properties['email'],
                     "company": company.get('name', ''),
                     "hubspot_id": existing_contact.get('id'),
                     "note": "Contact already exists"
@@ -181,11 +338,15 @@ class CRMIntegrationTool(BaseTool):
                 "error": f"Unexpected error: {str(e)}"
             }
 
+AGENT_ROLE = 'Pipeline Manager'
+AGENT_GOAL = 'Score leads and manage CRM integration for qualified prospects'
+AGENT_BACKSTORY = 'Expert at evaluating prospect quality and managing sales pipeline.'
+
 def create_pipeline_manager_agent():
     return Agent(
-        role='Pipeline Manager',
-        goal='Score leads and manage CRM integration for qualified prospects',
-        backstory='Expert at evaluating prospect quality and managing sales pipeline.',
+        role=AGENT_ROLE,
+        goal=AGENT_GOAL,
+        backstory=AGENT_BACKSTORY,
         tools=[LeadScoringTool(), CRMIntegrationTool()],
         verbose=True
     )
\ No newline at end of file
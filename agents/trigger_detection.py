@@ -3,7 +3,39 @@ from crewai.tools import BaseTool
 from datetime import datetime, timedelta
 from typing import Any, List
 from pydantic import BaseModel, Field
-from .utils import validate_companies_input, safe_mcp_call
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import re
+import threading
+from .utils import validate_companies_input, safe_mcp_call, safe_mcp_batch
+
+# LinkedIn rate-limits aggressively, so keep its scrapes to a couple at a time
+# across the whole process; the workflow runs one tool call per company, so a
+# per-call limit alone would allow one scrape per company in flight
+LINKEDIN_MAX_CONCURRENCY = 2
+_linkedin_slots = threading.BoundedSemaphore(LINKEDIN_MAX_CONCURRENCY)
+
+# Plain substring alternations (no word boundaries), matching the original
+# "keyword in text" checks; run against already-lowercased text. Both kinds
+# are found in one scan: the zero-width lookahead lets keywords overlap, and
+# the named group that matched tells which kind it was.
+_NEWS_TRIGGER_RE = re.compile(
+    r'(?=(?P<leadership>ceo|cto|vp|hired|joins|appointed)|(?P<expansion>expansion|new office|opening|market))'
+)
+_NEWS_TEXT_FIELDS = ('title', 'snippet', 'description', 'content')
+_SEVERITY_WEIGHTS = {'high': 15, 'medium': 10, 'low': 5}
+
+# Constant fields of each trigger kind; detectors add description and date_detected
+_HIRING_TEMPLATE = {'type': 'hiring_spike', 'severity': 'high', 'source': 'linkedin_api'}
+_ACTIVITY_TEMPLATE = {'type': 'company_activity', 'severity': 'medium', 'source': 'linkedin_api'}
+_FUNDING_TEMPLATE = {'type': 'funding_round', 'severity': 'high', 'source': 'news_search'}
+_LEADERSHIP_TEMPLATE = {'type': 'leadership_change', 'severity': 'medium', 'source': 'news_search'}
+_EXPANSION_TEMPLATE = {'type': 'expansion', 'severity': 'medium', 'source': 'news_search'}
+# Keyword trigger kinds in reporting order: group name, template, description
+_NEWS_TRIGGERS = (
+    ('leadership', _LEADERSHIP_TEMPLATE, "Leadership changes detected at {}"),
+    ('expansion', _EXPANSION_TEMPLATE, "Business expansion detected at {}")
+)
 
 class TriggerDetectionInput(BaseModel):
     companies: List[dict] = Field(description="List of companies to analyze for trigger events")
@@ -23,30 +55,60 @@ class TriggerDetectionTool(BaseTool):
         if not companies:
             return []
         
+        now_iso = datetime.now().isoformat()
+        linkedin_map, funding_map, news_map = self._prefetch_company_data(
+            [company['name'] for company in companies if company.get('name')]
+        )
+        
         for company in companies:
-                
-            triggers = []
-            
-            hiring_signals = self._detect_hiring_triggers(company)
-            triggers.extend(hiring_signals)
-            
-            funding_signals = self._detect_funding_triggers(company)
-            triggers.extend(funding_signals)
-            
-            leadership_signals = self._detect_leadership_triggers(company)
-            triggers.extend(leadership_signals)
-            
-            expansion_signals = self._detect_expansion_triggers(company)
-            triggers.extend(expansion_signals)
-            
-            company['trigger_events'] = triggers
-            company['trigger_score'] = self._calculate_trigger_score(triggers)
+            name = company.get('name')
+            if not name:
+                # Nothing to search for; skip the detectors entirely
+                company['trigger_events'] = []
+                company['trigger_score'] = 0
+                continue
+            self._process_company(
+                company,
+                linkedin_map.get(name, {}),
+                funding_map.get(name, {}),
+                news_map.get(name, {}),
+                now_iso
+            )
         
         return sorted(companies, key=lambda x: x.get('trigger_score', 0), reverse=True)
     
-    def _detect_hiring_triggers(self, company):
+    def _prefetch_company_data(self, names):
+        """Fetch LinkedIn, funding and news data for all companies, one batch per method."""
+        if not names:
+            return {}, {}, {}
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            linkedin = executor.submit(self._scrape_linkedin_batch, names)
+            funding = executor.submit(safe_mcp_batch, self.mcp, 'search_funding_news', names)
+            news = executor.submit(safe_mcp_batch, self.mcp, 'search_company_news', names)
+            return linkedin.result(), funding.result(), news.result()
+    
+    def _scrape_linkedin_batch(self, names):
+        """LinkedIn data for each name, holding a process-wide slot per scrape."""
+        unique_names = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=min(LINKEDIN_MAX_CONCURRENCY, len(unique_names))) as executor:
+            return dict(zip(unique_names, executor.map(self._scrape_linkedin, unique_names)))
+    
+    def _scrape_linkedin(self, name):
+        with _linkedin_slots:
+            return safe_mcp_call(self.mcp, 'scrape_company_linkedin', name)
+    
+    def _process_company(self, company, linkedin_data, funding_data, news_data, now_iso):
+        """Run every trigger detector for one company and store the results on it."""
+        hiring_signals = self._detect_hiring_triggers(company, linkedin_data, now_iso)
+        funding_signals = self._detect_funding_triggers(company, funding_data, now_iso)
+        news_signals = self._detect_news_triggers(company, self._news_texts(news_data), now_iso)
+        
+        triggers = list(chain(hiring_signals, funding_signals, news_signals))
+        company['trigger_events'] = triggers
+        company['trigger_score'] = self._calculate_trigger_score(triggers)
+    
+    def _detect_hiring_triggers(self, company, linkedin_data, now_iso):
         """Detect hiring triggers using LinkedIn data."""
-        linkedin_data = safe_mcp_call(self.mcp, 'scrape_company_linkedin', company['name'])
         triggers = []
         
         if linkedin_data:
@@ -55,86 +117,78 @@ class TriggerDetectionTool(BaseTool):
             
             if hiring_posts:
                 triggers.append({
-                    'type': 'hiring_spike',
-                    'severity': 'high',
+                    **_HIRING_TEMPLATE,
                     'description': f"Active hiring detected at {company['name']} - {len(hiring_posts)} open positions",
-                    'date_detected': datetime.now().isoformat(),
-                    'source': 'linkedin_api'
+                    'date_detected': now_iso
                 })
             
             if recent_activity:
                 triggers.append({
-                    'type': 'company_activity',
-                    'severity': 'medium',
+                    **_ACTIVITY_TEMPLATE,
                     'description': f"Increased LinkedIn activity at {company['name']}",
-                    'date_detected': datetime.now().isoformat(),
-                    'source': 'linkedin_api'
+                    'date_detected': now_iso
                 })
         
         return triggers
     
     
-    def _detect_funding_triggers(self, company):
+    def _detect_funding_triggers(self, company, funding_data, now_iso):
         """Detect funding triggers using news search."""
-        funding_data = safe_mcp_call(self.mcp, 'search_funding_news', company['name'])
         triggers = []
         
         if funding_data and funding_data.get('results'):
             triggers.append({
-                'type': 'funding_round',
-                'severity': 'high',
+                **_FUNDING_TEMPLATE,
                 'description': f"Recent funding activity detected at {company['name']}",
-                'date_detected': datetime.now().isoformat(),
-                'source': 'news_search'
+                'date_detected': now_iso
             })
         
         return triggers
     
     
-    def _detect_leadership_triggers(self, company):
-        """Detect leadership changes using news search."""
-        return self._detect_keyword_triggers(
-            company, 'leadership_change', 'medium',
-            ['ceo', 'cto', 'vp', 'hired', 'joins', 'appointed'],
-            f"Leadership changes detected at {company['name']}"
-        )
-    
-    def _detect_expansion_triggers(self, company):
-        """Detect business expansion using news search."""
-        return self._detect_keyword_triggers(
-            company, 'expansion', 'medium',
-            ['expansion', 'new office', 'opening', 'market'],
-            f"Business expansion detected at {company['name']}"
-        )
-    
-    def _detect_keyword_triggers(self, company, trigger_type, severity, keywords, description):
-        """Generic method to detect triggers based on keywords in news."""
-        news_data = safe_mcp_call(self.mcp, 'search_company_news', company['name'])
-        triggers = []
-        
-        if news_data and news_data.get('results'):
-            for result in news_data['results']:
-                if any(keyword in str(result).lower() for keyword in keywords):
-                    triggers.append({
-                        'type': trigger_type,
-                        'severity': severity,
-                        'description': description,
-                        'date_detected': datetime.now().isoformat(),
-                        'source': 'news_search'
-                    })
+    def _detect_news_triggers(self, company, news_texts, now_iso):
+        """Detect leadership changes and business expansion in already-fetched news."""
+        found = set()
+        for text in news_texts:
+            for match in _NEWS_TRIGGER_RE.finditer(text):
+                found.add(match.lastgroup)
+                if len(found) == len(_NEWS_TRIGGERS):
                     break
+            if len(found) == len(_NEWS_TRIGGERS):
+                break
         
-        return triggers
+        return [
+            {**template, 'description': description.format(company['name']), 'date_detected': now_iso}
+            for kind, template, description in _NEWS_TRIGGERS
+            if kind in found
+        ]
+    
+    def _news_texts(self, news_data):
+        """Searchable text of every news result for one company."""
+        if not news_data or not news_data.get('results'):
+            return []
+        return [self._news_result_text(result) for result in news_data['results']]
+    
+    def _news_result_text(self, result):
+        """Lowercased searchable text of a news result, without its URL or metadata."""
+        if not isinstance(result, dict):
+            return str(result).lower()
+        return ' '.join(str(result.get(field, '')) for field in _NEWS_TEXT_FIELDS).lower()
     
     def _calculate_trigger_score(self, triggers):
-        severity_weights = {'high': 15, 'medium': 10, 'low': 5}
-        return sum(severity_weights.get(t.get('severity', 'low'), 5) for t in triggers)
+        # Severities come from the detectors above, so every trigger has one
+        weights = _SEVERITY_WEIGHTS
+        return sum(weights.get(t['severity'], 5) for t in triggers)
+
+AGENT_ROLE = 'Trigger Event Analyst'
+AGENT_GOAL = 'Identify buying signals and optimal timing for outreach'
+AGENT_BACKSTORY = 'Expert at detecting business events that indicate readiness to buy.'
 
 def create_trigger_detection_agent(mcp_client):
     return Agent(
-        role='Trigger Event Analyst',
-        goal='Identify buying signals and optimal timing for outreach',
-        backstory='Expert at detecting business events that indicate readiness to buy.',
+        role=AGENT_ROLE,
+        goal=AGENT_GOAL,
+        backstory=AGENT_BACKSTORY,
         tools=[TriggerDetectionTool(mcp_client)],
         verbose=True
     )
@@ -2,8 +2,18 @@
 Shared utility functions for all agent modules.
 """
 from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlparse
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+MCP_BATCH_MAX_WORKERS = 8
+
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 
 def validate_companies_input(companies: Any) -> List[Dict]:
     """Validate and normalize companies input across all agents."""
@@ -11,61 +21,100 @@ def validate_companies_input(companies: Any) -> List[Dict]:
         companies = companies['companies']
     
     if not isinstance(companies, list):
-        print(f"Warning: Expected list of companies, got {type(companies)}")
+        logger.warning("Expected list of companies, got %s", type(companies))
         return []
     
     if not companies:
-        print("No companies provided")
+        logger.info("No companies provided")
         return []
     
-    valid_companies = []
-    for company in companies:
-        if isinstance(company, dict):
-            valid_companies.append(company)
-        else:
-            print(f"Warning: Expected company dict, got {type(company)}")
+    valid_companies = [company for company in companies if isinstance(company, dict)]
+    skipped = len(companies) - len(valid_companies)
+    if skipped:
+        logger.warning("Skipped %d non-dict company entries", skipped)
     
     return valid_companies
 
 
 def safe_mcp_call(mcp_client, method_name: str, *args, **kwargs) -> Dict:
-    """Safely call MCP methods with consistent error handling."""
+    """Safely call MCP methods with consistent error handling.
+    
+    Responses are cached by the MCP client itself; empty and error results
+    map to {}.
+    """
     try:
         method = getattr(mcp_client, method_name)
         result = method(*args, **kwargs)
         return result if result and not result.get('error') else {}
     except Exception as e:
-        print(f"Error calling MCP {method_name}: {str(e)}")
+        logger.warning("Error calling MCP %s: %s", method_name, e)
         return {}
 
 
+def safe_mcp_batch(mcp_client, method_name: str, args_list: List[Any],
+                   max_workers: int = MCP_BATCH_MAX_WORKERS) -> Dict[Any, Dict]:
+    """Call a single-argument MCP method for many arguments, returning {arg: result}.
+    
+    Uses the client's `<method_name>_batch` endpoint when it has one and
+    otherwise fans safe_mcp_call out over a thread pool. Failures map to {}
+    the same way as in safe_mcp_call.
+    """
+    pending = list(dict.fromkeys(args_list))
+    if not pending:
+        return {}
+    
+    batch_method = getattr(mcp_client, f"{method_name}_batch", None)
+    if batch_method is None:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            fetched = executor.map(lambda arg: safe_mcp_call(mcp_client, method_name, arg), pending)
+            return dict(zip(pending, fetched))
+    
+    try:
+        batch = batch_method(pending) or {}
+    except Exception as e:
+        logger.warning("Error calling MCP %s_batch: %s", method_name, e)
+        return {arg: {} for arg in pending}
+    
+    results = {}
+    for arg in pending:
+        result = batch.get(arg) or {}
+        results[arg] = {} if result.get('error') else result
+    return results
+
+
 def validate_email(email: str) -> bool:
     """Validate email format."""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    # Cheap reject for placeholders like '' or 'N/A' before running the regex
+    return '@' in email and _EMAIL_RE.match(email) is not None
+
+
+def precompute_company_stats(company: Dict) -> Dict:
+    """Cache trigger summaries on the company so scoring helpers don't rescan trigger_events."""
+    triggers = company.get('trigger_events', [])
+    company['_trigger_types'] = tuple(dict.fromkeys(t.get('type', '') for t in triggers))
+    company['_recent_high_triggers'] = sum(1 for t in triggers if 'high' in t.get('severity', ''))
+    return company
 
 
 def deduplicate_by_key(items: List[Dict], key_func) -> List[Dict]:
     """Remove duplicates from list of dicts using a key function."""
-    seen = set()
-    unique_items = []
+    unique_items = {}
     
     for item in items:
         key = key_func(item)
-        if key and key not in seen:
-            seen.add(key)
-            unique_items.append(item)
+        if key and key not in unique_items:
+            unique_items[key] = item
     
-    return unique_items
+    return list(unique_items.values())
 
 
+@lru_cache(maxsize=4096)
 def extract_domain_from_url(url: str) -> str:
     """Extract domain from URL with fallback parsing."""
     if not url:
         return ""
     
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(url)
         return parsed.netloc
     except:
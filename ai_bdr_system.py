@@ -1,11 +1,16 @@
 import streamlit as st
+import asyncio
+import gzip
 import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 from dotenv import load_dotenv
-from crewai import Crew, Process, Task
 import pandas as pd
+import numpy as np
 from datetime import datetime
-import json
-from mcp_client import BrightDataMCP
+from mcp_client import BrightDataMCP, get_cache_stats
 from agents.company_discovery import create_company_discovery_agent
 from agents.trigger_detection import create_trigger_detection_agent
 from agents.contact_research import create_contact_research_agent
@@ -14,6 +19,273 @@ from agents.pipeline_manager import create_pipeline_manager_agent
 
 load_dotenv()
 
+MAX_PARALLEL_COMPANIES = 8
+MAX_CONCURRENT_WORKFLOWS = 4
+# How often the page re-renders to pick up background workflow progress
+WORKFLOW_POLL_SECONDS = 0.5
+# Reports larger than this are offered gzip-compressed
+EXPORT_GZIP_THRESHOLD_BYTES = 5 * 1024 * 1024
+
+SEVERITY_EMOJI = {"high": "🔥", "medium": "⚡", "low": "💡"}
+# Confidence below 50 is red, 50-74 yellow and 75 or more green
+CONFIDENCE_BANDS = np.array([50, 75])
+CONFIDENCE_EMOJI = np.array(["🔴", "🟡", "🟢"])
+
+
+async def process_companies(companies, trigger_tool, contact_tool, message_tool, target_roles, message_types,
+                            on_progress=None, cancel_event=None, reuse_cached_messages=True):
+    """Fan out trigger detection, contact research and message generation per company.
+    
+    Each company runs the three stages in order in worker threads, with up to
+    MAX_PARALLEL_COMPANIES companies in flight. on_progress(done, total, company)
+    is called as each company finishes, and once cancel_event is set the
+    remaining stages are skipped. With reuse_cached_messages False every
+    message is generated fresh instead of reusing one from an identical
+    earlier prompt. Returns the processed companies in input order and a
+    list of (company, exception) pairs for the ones that failed.
+    """
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_COMPANIES)
+    
+    async def process_company(index, company):
+        async with semaphore:
+            try:
+                check_cancelled(cancel_event)
+                batch = await asyncio.to_thread(trigger_tool._run, [company])
+                check_cancelled(cancel_event)
+                batch = await asyncio.to_thread(contact_tool._run, batch, target_roles)
+                check_cancelled(cancel_event)
+                batch = await asyncio.to_thread(
+                    message_tool._run, batch, message_types=message_types, use_cache=reuse_cached_messages
+                )
+                return index, company, (batch[0] if batch else company)
+            except Exception as e:
+                return index, company, e
+    
+    results = {}
+    pending = [process_company(index, company) for index, company in enumerate(companies)]
+    for done, future in enumerate(asyncio.as_completed(pending), 1):
+        index, company, result = await future
+        results[index] = (company, result)
+        if on_progress:
+            on_progress(done, len(companies), company)
+    
+    processed, failures = [], []
+    for index in range(len(companies)):
+        company, result = results[index]
+        if isinstance(result, Exception):
+            failures.append((company, result))
+        else:
+            processed.append(result)
+    return processed, failures
+
+
+class WorkflowCancelled(Exception):
+    """Raised inside a background workflow once the user has cancelled it."""
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise WorkflowCancelled()
+
+
+@st.cache_resource
+def get_workflow_executor():
+    """Process-wide pool that runs workflows off the Streamlit script thread."""
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_WORKFLOWS, thread_name_prefix="bdr-workflow")
+
+
+@st.cache_resource
+def get_agents():
+    """Build the Bright Data client and the five agents once per server process.
+    
+    The agents' tools keep no per-run state, so reruns and concurrent
+    workflows share them.
+    """
+    mcp_client = BrightDataMCP()
+    return {
+        'discovery': create_company_discovery_agent(mcp_client),
+        'trigger': create_trigger_detection_agent(mcp_client),
+        'contact': create_contact_research_agent(mcp_client),
+        'message': create_message_generation_agent(),
+        'pipeline': create_pipeline_manager_agent()
+    }
+
+
+def run_workflow(config, agents, progress_queue, cancel_event):
+    """Run the full prospecting workflow in a background thread.
+    
+    Progress is reported through progress_queue as ('progress', percent, text),
+    ('success', text) or ('warning', text) tuples, since Streamlit elements
+    can only be drawn from the script thread. Stops between stages once
+    cancel_event is set.
+    """
+    industry = config['industry']
+    size_range = config['size_range']
+    location = config['location']
+    max_companies = config['max_companies']
+    target_roles = config['target_roles']
+    message_types = config['message_types']
+    min_lead_grade = config['min_lead_grade']
+    
+    discovery_agent = agents['discovery']
+    trigger_agent = agents['trigger']
+    contact_agent = agents['contact']
+    message_agent = agents['message']
+    pipeline_agent = agents['pipeline']
+
+    progress_queue.put(('progress', 15, "🔍 Discovering companies matching ICP..."))
+
+    companies = discovery_agent.tools[0]._run(industry, size_range, location)
+
+    progress_queue.put(('success', f"✅ Discovered {len(companies)} companies"))
+    if len(companies) > max_companies:
+        companies = companies[:max_companies]
+        progress_queue.put(('success', f"✅ Researching the first {max_companies} companies"))
+    check_cancelled(cancel_event)
+
+    progress_queue.put(('progress', 30, "🎯 Analyzing triggers, contacts and outreach for each company in parallel..."))
+
+    def report_company_progress(done, total, company):
+        progress_queue.put((
+            'progress',
+            30 + int(45 * done / total),
+            f"🎯 Researched {company.get('name', 'Unknown')} ({done}/{total} companies)"
+        ))
+
+    companies_with_messages, failures = asyncio.run(process_companies(
+        companies,
+        trigger_agent.tools[0],
+        contact_agent.tools[0],
+        message_agent.tools[0],
+        target_roles,
+        message_types or ["cold_email"],
+        on_progress=report_company_progress,
+        cancel_event=cancel_event,
+        reuse_cached_messages=config.get('reuse_cached_messages', True)
+    ))
+    check_cancelled(cancel_event)
+    for failed_company, error in failures:
+        progress_queue.put(('warning', f"⚠️ Skipped {failed_company.get('name', 'Unknown')}: {str(error)}"))
+
+    total_triggers = total_contacts = 0
+    for company in companies_with_messages:
+        total_triggers += len(company.get('trigger_events', []))
+        total_contacts += len(company.get('contacts', []))
+    
+    progress_queue.put(('success', f"✅ Detected {total_triggers} trigger events"))
+    progress_queue.put(('success', f"✅ Found {total_contacts} verified contacts"))
+    # Every contact gets a message, failed generations included
+    progress_queue.put(('success', f"✅ Generated {total_contacts} personalized messages"))
+    progress_queue.put(('progress', 75, "📊 Scoring leads and updating CRM..."))
+
+    final_companies = pipeline_agent.tools[0]._run(companies_with_messages)
+    qualified_leads = sum(c.get('lead_grade', 'D') in ('A', 'B') for c in final_companies)
+
+    crm_results = {"success": 0, "errors": 0}
+    check_cancelled(cancel_event)
+    if os.getenv("HUBSPOT_API_KEY"):
+        crm_results = pipeline_agent.tools[1]._run(final_companies, min_lead_grade)
+
+    progress_queue.put(('progress', 100, "✅ Workflow completed successfully!"))
+
+    return {
+        'companies': final_companies,
+        'total_companies': len(final_companies),
+        'total_triggers': total_triggers,
+        'total_contacts': total_contacts,
+        'qualified_leads': qualified_leads,
+        'crm_results': crm_results,
+        'timestamp': datetime.now()
+    }
+
+
+def exported_crm_emails(crm_results):
+    """Lowercased emails HubSpot has already accepted for this run's results."""
+    return {
+        detail['email'].lower()
+        for detail in crm_results.get('details', [])
+        if detail.get('success') and detail.get('email')
+    }
+
+
+# Source columns the CSV report is built from once contacts are flattened
+_EXPORT_SOURCE_COLUMNS = [
+    'company_name', 'company_industry', 'company_lead_grade', 'company_lead_score',
+    'company_trigger_events', 'first_name', 'last_name', 'title', 'email',
+    'confidence_score', 'generated_message.subject', 'generated_message.body'
+]
+
+
+def build_export_frame(companies):
+    """Flatten companies and their contacts into the CSV report, one row per contact."""
+    with_contacts = [c for c in companies if c.get('contacts')]
+    if not with_contacts:
+        return pd.DataFrame()
+    
+    df = pd.json_normalize(
+        with_contacts,
+        record_path='contacts',
+        meta=['name', 'industry', 'lead_grade', 'lead_score', 'trigger_events'],
+        meta_prefix='company_',
+        errors='ignore'
+    ).reindex(columns=_EXPORT_SOURCE_COLUMNS)
+    
+    return pd.DataFrame({
+        'Company': df['company_name'].fillna(''),
+        'Industry': df['company_industry'].fillna(''),
+        'Lead Grade': df['company_lead_grade'].fillna(''),
+        'Lead Score': df['company_lead_score'].fillna(0),
+        'Trigger Count': df['company_trigger_events'].str.len().fillna(0).astype(int),
+        'Contact Name': df['first_name'].fillna('') + ' ' + df['last_name'].fillna(''),
+        'Title': df['title'].fillna(''),
+        'Email': df['email'].fillna(''),
+        'Confidence': df['confidence_score'].fillna(0),
+        'Subject Line': df['generated_message.subject'].fillna(''),
+        'Message': df['generated_message.body'].fillna('')
+    })
+
+
+COMPANY_TABLE_COLUMNS = {
+    "Lead Score": st.column_config.ProgressColumn("Lead Score", min_value=0, max_value=100, format="%.0f"),
+    "ICP Score": st.column_config.NumberColumn("ICP Score", format="%d"),
+    "Domain": st.column_config.TextColumn("Domain"),
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_company_frame(results_timestamp, _companies):
+    """One row per company for the results table, cached per run timestamp.
+    
+    Rows keep the order of _companies so a selected row index maps straight
+    back to its company.
+    """
+    return pd.DataFrame({
+        'Company': [c.get('name', 'Unknown') for c in _companies],
+        'Grade': [c.get('lead_grade', 'D') for c in _companies],
+        'Lead Score': [c.get('lead_score', 0) for c in _companies],
+        'ICP Score': [c.get('icp_score', 0) for c in _companies],
+        'Industry': [c.get('industry', 'Unknown') for c in _companies],
+        'Domain': [c.get('domain', '') for c in _companies],
+        'Triggers': [len(c.get('trigger_events', [])) for c in _companies],
+        'Contacts': [len(c.get('contacts', [])) for c in _companies]
+    })
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_export_csv(results_timestamp, _companies):
+    """CSV report bytes for one workflow run, cached per run timestamp.
+    
+    Returns (data, compressed); data is None when there are no contacts.
+    """
+    df = build_export_frame(_companies)
+    if df.empty:
+        return None, False
+    
+    data = df.to_csv(index=False).encode('utf-8')
+    if len(data) > EXPORT_GZIP_THRESHOLD_BYTES:
+        return gzip.compress(data), True
+    return data, False
+
 st.set_page_config(
     page_title="AI BDR/SDR System",
     page_icon="🤖",
@@ -52,6 +324,11 @@ with st.sidebar:
         ["cold_email", "linkedin_message", "follow_up"],
         default=["cold_email"]
     )
+    reuse_cached_messages = st.checkbox(
+        "Reuse previously generated messages",
+        value=True,
+        help="Unchecked, every run writes fresh messages instead of repeating ones generated for the same contact and context in the last 24 hours"
+    )
     
     with st.expander("Advanced Intelligence"):
         enable_competitive = st.checkbox("Competitive Intelligence", value=True)
@@ -92,13 +369,24 @@ with st.sidebar:
                     """)
             else:
                 st.error(f"❌ {name} Missing")
+    
+    cache_stats = get_cache_stats()
+    cache_lookups = cache_stats['hits'] + cache_stats['misses']
+    if cache_lookups:
+        st.caption(
+            f"🗄️ Bright Data cache: {cache_stats['hits'] / cache_lookups:.0%} hit rate "
+            f"({cache_stats['hits']}/{cache_lookups} lookups)"
+        )
 
 col1, col2 = st.columns([3, 1])
 
 with col1:
     st.subheader("🚀 AI Prospecting Workflow")
     
-    if st.button("Start Multi-Agent Prospecting", type="primary", use_container_width=True):
+    workflow_running = st.session_state.get('workflow_future') is not None
+    
+    if st.button("Start Multi-Agent Prospecting", type="primary", use_container_width=True,
+                 disabled=workflow_running):
         required_keys = ["BRIGHT_DATA_API_TOKEN", "OPENAI_API_KEY"]
         missing_keys = [key for key in required_keys if not os.getenv(key)]
         
@@ -106,138 +394,62 @@ with col1:
             st.error(f"Missing required API keys: {', '.join(missing_keys)}")
             st.stop()
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        workflow_config = {
+            'industry': industry,
+            'size_range': size_range,
+            'location': location,
+            'max_companies': max_companies,
+            'target_roles': target_roles,
+            'message_types': message_types,
+            'reuse_cached_messages': reuse_cached_messages,
+            'min_lead_grade': min_lead_grade
+        }
+        st.session_state.workflow_progress = queue.Queue()
+        st.session_state.workflow_cancel = threading.Event()
+        st.session_state.workflow_status = (0, "🚀 Starting workflow...")
+        st.session_state.workflow_log = []
+        st.session_state.workflow_future = get_workflow_executor().submit(
+            run_workflow,
+            workflow_config,
+            get_agents(),
+            st.session_state.workflow_progress,
+            st.session_state.workflow_cancel
+        )
+        st.rerun()
+    
+    workflow_future = st.session_state.get('workflow_future')
+    if workflow_future is not None:
+        while True:
+            try:
+                kind, *payload = st.session_state.workflow_progress.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                st.session_state.workflow_status = tuple(payload)
+            else:
+                st.session_state.workflow_log.append((kind, payload[0]))
         
-        try:
-            mcp_client = BrightDataMCP()
-            
-            discovery_agent = create_company_discovery_agent(mcp_client)
-            trigger_agent = create_trigger_detection_agent(mcp_client)
-            contact_agent = create_contact_research_agent(mcp_client)
-            message_agent = create_message_generation_agent()
-            pipeline_agent = create_pipeline_manager_agent()
-            
-            status_text.text("🔍 Discovering companies matching ICP...")
-            progress_bar.progress(15)
-            
-            discovery_task = Task(
-                description=f"Find {max_companies} companies in {industry} ({size_range} size) in {location}",
-                expected_output="List of companies with ICP scores and intelligence",
-                agent=discovery_agent
-            )
-            
-            discovery_crew = Crew(
-                agents=[discovery_agent],
-                tasks=[discovery_task],
-                process=Process.sequential
-            )
-            
-            companies = discovery_agent.tools[0]._run(industry, size_range, location)
-            
-            st.success(f"✅ Discovered {len(companies)} companies")
-            
-            status_text.text("🎯 Analyzing trigger events and buying signals...")
-            progress_bar.progress(30)
-            
-            trigger_task = Task(
-                description="Detect hiring spikes, funding rounds, leadership changes, and expansion signals",
-                expected_output="Companies with trigger events and scores",
-                agent=trigger_agent
-            )
-            
-            trigger_crew = Crew(
-                agents=[trigger_agent],
-                tasks=[trigger_task],
-                process=Process.sequential
-            )
-            
-            companies_with_triggers = trigger_agent.tools[0]._run(companies)
-            
-            total_triggers = sum(len(c.get('trigger_events', [])) for c in companies_with_triggers)
-            
-            st.success(f"✅ Detected {total_triggers} trigger events")
-            progress_bar.progress(45)
-            
-            status_text.text("👥 Finding decision-maker contacts...")
-            
-            contact_task = Task(
-                description=f"Find verified contacts for roles: {', '.join(target_roles)}",
-                expected_output="Companies with decision-maker contact information",
-                agent=contact_agent
-            )
-            
-            contact_crew = Crew(
-                agents=[contact_agent],
-                tasks=[contact_task],
-                process=Process.sequential
-            )
-            
-            companies_with_contacts = contact_agent.tools[0]._run(companies_with_triggers, target_roles)
-            
-            total_contacts = sum(len(c.get('contacts', [])) for c in companies_with_contacts)
-            
-            st.success(f"✅ Found {total_contacts} verified contacts")
-            progress_bar.progress(60)
-            
-            status_text.text("✍️ Generating personalized outreach messages...")
-            
-            message_task = Task(
-                description=f"Generate {', '.join(message_types)} for each contact using trigger intelligence",
-                expected_output="Companies with personalized messages",
-                agent=message_agent
-            )
-            
-            message_crew = Crew(
-                agents=[message_agent],
-                tasks=[message_task],
-                process=Process.sequential
-            )
-            
-            companies_with_messages = message_agent.tools[0]._run(companies_with_contacts, message_types[0])
-            
-            total_messages = sum(len(c.get('contacts', [])) for c in companies_with_messages)
-            
-            st.success(f"✅ Generated {total_messages} personalized messages")
-            progress_bar.progress(75)
-            
-            status_text.text("📊 Scoring leads and updating CRM...")
-            
-            pipeline_task = Task(
-                description=f"Score leads and export Grade {min_lead_grade}+ to HubSpot CRM",
-                expected_output="Scored leads with CRM integration results",
-                agent=pipeline_agent
-            )
-            
-            pipeline_crew = Crew(
-                agents=[pipeline_agent],
-                tasks=[pipeline_task],
-                process=Process.sequential
-            )
-            
-            final_companies = pipeline_agent.tools[0]._run(companies_with_messages)
-            qualified_leads = [c for c in final_companies if c.get('lead_grade', 'D') in ['A', 'B']]
-            
-            crm_results = {"success": 0, "errors": 0}
-            if os.getenv("HUBSPOT_API_KEY"):
-                crm_results = pipeline_agent.tools[1]._run(final_companies, min_lead_grade)
-            
-            progress_bar.progress(100)
-            status_text.text("✅ Workflow completed successfully!")
-            
-            st.session_state.workflow_results = {
-                'companies': final_companies,
-                'total_companies': len(final_companies),
-                'total_triggers': total_triggers,
-                'total_contacts': total_contacts,
-                'qualified_leads': len(qualified_leads),
-                'crm_results': crm_results,
-                'timestamp': datetime.now()
-            }
-            
-        except Exception as e:
-            st.error(f"❌ Workflow failed: {str(e)}")
-            st.write("Please check your API configurations and try again.")
+        progress_value, status_message = st.session_state.workflow_status
+        st.progress(progress_value)
+        st.text(status_message)
+        for kind, message in st.session_state.workflow_log:
+            getattr(st, kind)(message)
+        
+        if workflow_future.done():
+            st.session_state.workflow_future = None
+            try:
+                st.session_state.workflow_results = workflow_future.result()
+            except (WorkflowCancelled, CancelledError):
+                st.warning("⏹️ Workflow cancelled")
+            except Exception as e:
+                st.error(f"❌ Workflow failed: {str(e)}")
+                st.write("Please check your API configurations and try again.")
+        else:
+            if st.button("⏹️ Cancel Workflow", use_container_width=True):
+                st.session_state.workflow_cancel.set()
+                workflow_future.cancel()
+            time.sleep(WORKFLOW_POLL_SECONDS)
+            st.rerun()
 
 if st.session_state.workflow_results:
     results = st.session_state.workflow_results
@@ -265,76 +477,73 @@ if st.session_state.workflow_results:
                 st.metric("Export Errors", results['crm_results']['errors'], delta_color="inverse")
     
     st.subheader("🏢 Company Intelligence")
+    st.caption("Select a company to see its triggers, contacts and messages.")
     
-    for company in results['companies'][:10]:
-        with st.expander(f"📋 {company.get('name', 'Unknown')} - Grade {company.get('lead_grade', 'D')} (Score: {company.get('lead_score', 0):.0f})"):
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write(f"**Industry:** {company.get('industry', 'Unknown')}")
-                st.write(f"**Domain:** {company.get('domain', 'Unknown')}")
-                st.write(f"**ICP Score:** {company.get('icp_score', 0)}")
-                
-                triggers = company.get('trigger_events', [])
-                if triggers:
-                    st.write("**🎯 Trigger Events:**")
-                    for trigger in triggers:
-                        severity_emoji = {"high": "🔥", "medium": "⚡", "low": "💡"}.get(trigger.get('severity', 'low'), '💡')
-                        st.write(f"{severity_emoji} {trigger.get('description', 'Unknown trigger')}")
-            
-            with col2:
-                contacts = company.get('contacts', [])
-                if contacts:
-                    st.write("**👥 Decision Makers:**")
-                    for contact in contacts:
-                        confidence = contact.get('confidence_score', 0)
-                        confidence_color = "🟢" if confidence >= 75 else "🟡" if confidence >= 50 else "🔴"
-                        
-                        st.write(f"{confidence_color} **{contact.get('first_name', '')} {contact.get('last_name', '')}**")
-                        st.write(f"   {contact.get('title', 'Unknown title')}")
-                        st.write(f"   📧 {contact.get('email', 'No email')}")
-                        st.write(f"   Confidence: {confidence}%")
-                        
-                        message = contact.get('generated_message', {})
-                        if message.get('subject'):
-                            st.write(f"   **Subject:** {message['subject']}")
-                        if message.get('body'):
-                            preview = message['body'][:100] + "..." if len(message['body']) > 100 else message['body']
-                            st.write(f"   **Preview:** {preview}")
-                        st.write("---")
+    companies_df = build_company_frame(results['timestamp'], results['companies'])
+    table = st.dataframe(
+        companies_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config=COMPANY_TABLE_COLUMNS,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="company_table"
+    )
+    
+    selected_rows = table.selection.rows
+    if selected_rows:
+        company = results['companies'][selected_rows[0]]
+        st.markdown(f"#### 📋 {company.get('name', 'Unknown')} - Grade {company.get('lead_grade', 'D')} (Score: {company.get('lead_score', 0):.0f})")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write(f"**Industry:** {company.get('industry', 'Unknown')}")
+            st.write(f"**Domain:** {company.get('domain', 'Unknown')}")
+            st.write(f"**ICP Score:** {company.get('icp_score', 0)}")
+            
+            triggers = company.get('trigger_events', [])
+            if triggers:
+                st.write("**🎯 Trigger Events:**")
+                for trigger in triggers:
+                    severity_emoji = SEVERITY_EMOJI.get(trigger.get('severity', 'low'), '💡')
+                    st.write(f"{severity_emoji} {trigger.get('description', 'Unknown trigger')}")
+        
+        with col2:
+            contacts = company.get('contacts', [])
+            if contacts:
+                st.write("**👥 Decision Makers:**")
+                confidences = [contact.get('confidence_score', 0) for contact in contacts]
+                confidence_colors = CONFIDENCE_EMOJI[np.digitize(confidences, CONFIDENCE_BANDS)]
+                for contact, confidence, confidence_color in zip(contacts, confidences, confidence_colors):
+                    
+                    st.write(f"{confidence_color} **{contact.get('first_name', '')} {contact.get('last_name', '')}**")
+                    st.write(f"   {contact.get('title', 'Unknown title')}")
+                    st.write(f"   📧 {contact.get('email', 'No email')}")
+                    st.write(f"   Confidence: {confidence}%")
+                    
+                    message = contact.get('generated_message', {})
+                    if message.get('subject'):
+                        st.write(f"   **Subject:** {message['subject']}")
+                    if message.get('body'):
+                        preview = message['body'][:100] + "..." if len(message['body']) > 100 else message['body']
+                        st.write(f"   **Preview:** {preview}")
+                    st.write("---")
     
     st.subheader("📥 Export & Actions")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        export_data = []
-        for company in results['companies']:
-            for contact in company.get('contacts', []):
-                export_data.append({
-                    'Company': company.get('name', ''),
-                    'Industry': company.get('industry', ''),
-                    'Lead Grade': company.get('lead_grade', ''),
-                    'Lead Score': company.get('lead_score', 0),
-                    'Trigger Count': len(company.get('trigger_events', [])),
-                    'Contact Name': f"{contact.get('first_name', '')} {contact.get('last_name', '')}",
-                    'Title': contact.get('title', ''),
-                    'Email': contact.get('email', ''),
-                    'Confidence': contact.get('confidence_score', 0),
-                    'Subject Line': contact.get('generated_message', {}).get('subject', ''),
-                    'Message': contact.get('generated_message', {}).get('body', '')
-                })
+        csv_data, compressed = build_export_csv(results['timestamp'], results['companies'])
         
-        if export_data:
-            df = pd.DataFrame(export_data)
-            csv = df.to_csv(index=False)
-            
+        if csv_data is not None:
+            file_name = f"ai_bdr_prospects_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
             st.download_button(
                 label="📄 Download Full Report (CSV)",
-                data=csv,
-                file_name=f"ai_bdr_prospects_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime="text/csv",
+                data=csv_data,
+                file_name=f"{file_name}.gz" if compressed else file_name,
+                mime="application/gzip" if compressed else "text/csv",
                 use_container_width=True
             )
     
@@ -344,10 +553,22 @@ if st.session_state.workflow_results:
                 st.warning("HubSpot API key required for CRM export")
             else:
                 with st.spinner("Syncing to HubSpot..."):
-                    pipeline_agent = create_pipeline_manager_agent()
-                    new_crm_results = pipeline_agent.tools[1]._run(results['companies'], min_lead_grade)
-                    st.session_state.workflow_results['crm_results'] = new_crm_results
-                st.rerun()
+                    pipeline_agent = get_agents()['pipeline']
+                    previous = results['crm_results']
+                    exported_emails = exported_crm_emails(previous)
+                    new_crm_results = pipeline_agent.tools[1]._run(
+                        results['companies'], min_lead_grade, exclude_emails=exported_emails
+                    )
+                if not new_crm_results.get('requested'):
+                    st.toast("Nothing new to sync")
+                else:
+                    st.session_state.workflow_results['crm_results'] = {
+                        "success": previous.get('success', 0) + new_crm_results['success'],
+                        "errors": new_crm_results['errors'],
+                        "details": [d for d in previous.get('details', []) if d.get('success')]
+                                   + new_crm_results['details']
+                    }
+                    st.rerun()
     
     with col3:
         if st.button("🗑️ Clear Results", use_container_width=True):
@@ -1,14 +1,491 @@
 import os
-import json
+import re
+import asyncio
+import atexit
+import orjson
+import time
+import hashlib
+import threading
+import functools
+import logging
+import queue
 import streamlit as st
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlsplit
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 from mcp import StdioServerParameters
+import anyio
+import lxml.html
+from lxml import etree
 
 from mcpadapt.core import MCPAdapt
 from mcpadapt.crewai_adapter import CrewAIAdapter
 
 load_dotenv()
 
+# Records are queued by the calling thread and written to stderr by a
+# listener thread, so concurrent searches never wait on console output. The
+# level is left to the application (warnings and errors by default);
+# per-search detail is logged at DEBUG.
+logger = logging.getLogger('brightdata_mcp')
+logger.propagate = False
+if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+    _log_queue = queue.Queue(-1)
+    _stream_handler = logging.StreamHandler()
+    _stream_handler.setFormatter(logging.Formatter('%(message)s'))
+    _log_listener = QueueListener(_log_queue, _stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    logger.addHandler(QueueHandler(_log_queue))
+
+# Errors that mean the MCP server's stdio session itself is gone (the
+# subprocess exited or its streams closed), as opposed to one tool failing.
+_MCP_TRANSPORT_ERRORS = (
+    OSError, EOFError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream
+)
+
+# Maximum number of searches a batch call keeps in flight at once.
+MAX_BATCH_WORKERS = 8
+# Companies enrich_companies works on at once; each runs four lookups.
+MAX_ENRICH_CONCURRENCY = 10
+# Page fetched through scrape-type tools; the query is appended URL-encoded.
+GOOGLE_SEARCH_URL = "https://www.google.com/search?q="
+
+# How long each endpoint's successful responses are reused, in seconds.
+# News moves quickly; company profiles and websites change slowly.
+CACHE_TTL_SECONDS = {
+    'search_funding_news': 60 * 60,
+    'search_company_news': 60 * 60,
+    'scrape_company_linkedin': 24 * 60 * 60,
+    'scrape_company_website': 24 * 60 * 60,
+}
+CACHE_MAX_ENTRIES = 4096
+# How long an empty or error response is reused in this process, so a call
+# that keeps failing isn't re-issued on every lookup but recovers quickly.
+NEGATIVE_CACHE_TTL_SECONDS = 60
+
+# Hosts of search-engine chrome links, checked with one set lookup per link
+_SERP_SKIP_HOSTS = frozenset({
+    'google.com', 'www.google.com', 'accounts.google.com', 'support.google.com',
+    'translate.google.com', 'webcache.googleusercontent.com'
+})
+_SERP_SKIP_HOST_SUFFIXES = ('.google.com',)
+_SERP_SKIP_HOST_PREFIXES = ('accounts.google.', 'support.google.', 'translate.google.')
+# Non-host markers of links that are not results (fragments, SERP paths, redirects)
+_SERP_LINK_SKIP_RE = re.compile('|'.join(map(re.escape, [
+    '/search?', 'javascript:', '#', 'mailto:', 'webcache', 'youtube.com/redirect'
+])))
+_REGEX_URL_SKIP_RE = re.compile('|'.join(map(re.escape, [
+    'google.com', 'youtube.com', 'accounts.google',
+    'support.google', 'translate.google'
+])))
+
+# HTML search pages are parsed incrementally in chunks of this many characters
+HTML_FEED_CHUNK_SIZE = 64 * 1024
+_MARKUP_PREFIX_RE = re.compile(r'\s*<')
+# First heading or span inside a result link, in document order
+_LINK_TITLE_XPATH = etree.XPath('(descendant::h3 | descendant::h2 | descendant::h1 | descendant::span)[1]')
+# Snippet candidates near a result link; the snippet, when present, sits in
+# the first few block/inline descendants of the link's container
+SNIPPET_MAX_CANDIDATES = 3
+_SNIPPET_CANDIDATES_XPATH = etree.XPath(
+    '(descendant::*[self::div or self::span or self::p])[position() <= %d]' % SNIPPET_MAX_CANDIDATES
+)
+_HTML_MARKER_RE = re.compile('html', re.IGNORECASE)
+
+_RESULT_URL_RE = re.compile(
+    r'https?://[^\s<>"]+\.(?:com|org|net|edu|gov|io|co|ai|tech|biz|info)[^\s<>"]*', re.IGNORECASE
+)
+_HEADING_TITLE_RE = re.compile(r'<h[1-6][^>]*>([^<]+)</h[1-6]>', re.IGNORECASE)
+_PAGE_TITLE_RE = re.compile(r'<title[^>]*>([^<]+)</title>', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _element_title_before(url_prefix):
+    """Element text followed later in the window by a URL starting with url_prefix."""
+    return re.compile(r'>([^<]{10,80})</[^>]*>(?=.*' + re.escape(url_prefix) + ')', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _text_title_before(url_prefix):
+    """Capitalised run of text followed later in the window by a URL starting with url_prefix."""
+    return re.compile(r'([A-Z][^|<>{}\[\]]{10,80})(?=.*' + re.escape(url_prefix) + ')', re.IGNORECASE)
+
+
+# Generic company-name words dropped from guessed LinkedIn slugs
+_LINKEDIN_SLUG_STRIP_RE = re.compile(r'systems|solutions|corp')
+_LINKEDIN_SLUG_TRANS = str.maketrans(' ', '-')
+
+# Keyword sets matched as plain substrings of a result's lowercased title and snippet
+_LINKEDIN_HIRING_RE = re.compile(r'hiring|jobs|careers|join')
+_LINKEDIN_ACTIVITY_RE = re.compile(r'announces|launches|proud|excited')
+_FUNDING_RE = re.compile(r'funding|investment|series a|series b|seed|raises|raised')
+
+
+def _is_serp_chrome_link(url):
+    """True for links that belong to the search engine's own pages rather than results."""
+    host = (urlsplit(url).hostname or '')
+    if (host in _SERP_SKIP_HOSTS
+            or host.endswith(_SERP_SKIP_HOST_SUFFIXES)
+            or host.startswith(_SERP_SKIP_HOST_PREFIXES)):
+        return True
+    return _SERP_LINK_SKIP_RE.search(url) is not None
+
+
+def _result_search_text(result):
+    """Lowercased title and snippet of a search result as one string.
+    
+    The NUL separator keeps a keyword from matching across the two fields.
+    """
+    return (result.get('title', '') + '\x00' + result.get('snippet', '')).lower()
+
+
+def _matching_result_indices(texts, pattern):
+    """Indices of the texts pattern matches, in order, from scans of one joined buffer.
+    
+    After a hit the scan resumes at the next text, so each text is searched
+    at most once and non-matching texts are skipped over by the regex engine
+    rather than by a Python loop.
+    """
+    buffer = '\x00'.join(texts)
+    starts = list(accumulate((len(text) + 1 for text in texts[:-1]), initial=0))
+    indices = []
+    pos = 0
+    while True:
+        match = pattern.search(buffer, pos)
+        if match is None:
+            break
+        index = bisect_right(starts, match.start()) - 1
+        indices.append(index)
+        if index + 1 >= len(starts):
+            break
+        pos = starts[index + 1]
+    return indices
+
+
+_TECH_KEYWORDS = {
+    'react': 'React',
+    'angular': 'Angular',
+    'vue': 'Vue.js',
+    'node.js': 'Node.js',
+    'python': 'Python',
+    'shopify': 'Shopify',
+    'salesforce': 'Salesforce'
+}
+# Lookahead so overlapping keywords (e.g. "node.jshopify") are all found
+_TECH_KEYWORD_RE = re.compile('(?=(' + '|'.join(map(re.escape, _TECH_KEYWORDS)) + '))')
+
+# Optional shared second tier: set REDIS_URL to share cached responses
+# across processes and restarts.
+REDIS_KEY_PREFIX = "bdmcp:"
+# A worker that finds another worker already fetching the same call waits
+# this long for its result before fetching it itself.
+REDIS_LOCK_TIMEOUT_SECONDS = 60
+REDIS_LOCK_POLL_SECONDS = 0.25
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0}
+_redis_client = None
+_redis_lock = threading.Lock()
+# Calls currently being fetched in this process, keyed by cache key
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _cache_key(endpoint, params):
+    """Stable digest of an endpoint call, used as the response cache key."""
+    payload = endpoint.encode('utf-8') + orjson.dumps(
+        params, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def get_cache_stats():
+    """Hit/miss counters for the Bright Data response cache."""
+    with _response_cache_lock:
+        return dict(_cache_stats)
+
+
+def _get_redis():
+    """Shared Redis client when REDIS_URL is set and redis-py is installed, else None."""
+    global _redis_client
+    url = os.getenv("REDIS_URL")
+    if not url or redis is None:
+        return None
+    with _redis_lock:
+        if _redis_client is None:
+            _redis_client = redis.Redis.from_url(url)
+        return _redis_client
+
+
+def _is_error_response(result):
+    """True for error responses and search responses without results.
+    
+    A failed MCP search surfaces as an empty 'results' list rather than an
+    error, so the news endpoints' empty responses count as negative too.
+    """
+    return not result or bool(result.get('error')) or ('results' in result and not result['results'])
+
+
+def _local_get(key, ttl):
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry:
+            if _is_error_response(entry[1]):
+                ttl = min(ttl, NEGATIVE_CACHE_TTL_SECONDS)
+            if time.monotonic() - entry[0] < ttl:
+                _response_cache.move_to_end(key)
+                return entry[1]
+    return None
+
+
+def _local_put(key, result, age=0.0):
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() - age, result)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > CACHE_MAX_ENTRIES:
+            _response_cache.popitem(last=False)
+
+
+def _redis_get_many(calls):
+    """Load (endpoint, param) calls from Redis with one MGET into the local cache.
+    
+    Returns the keys that were found. Redis stores the write time alongside
+    each response, so entries keep their remaining TTL in the local tier.
+    """
+    client = _get_redis()
+    if client is None or not calls:
+        return set()
+    keys = [_cache_key(endpoint, [param]) for endpoint, param in calls]
+    try:
+        values = client.mget([REDIS_KEY_PREFIX + key for key in keys])
+    except redis.RedisError as e:
+        logger.warning("⚠️ Redis cache read failed: %s", e)
+        return set()
+    
+    found = set()
+    now = time.time()
+    for (endpoint, _), key, value in zip(calls, keys, values):
+        if value is None:
+            continue
+        try:
+            entry = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            continue
+        age = now - entry['stored_at']
+        if age < CACHE_TTL_SECONDS[endpoint]:
+            _local_put(key, entry['result'], age)
+            found.add(key)
+    return found
+
+
+def _redis_put(key, result, ttl):
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.set(
+            REDIS_KEY_PREFIX + key,
+            orjson.dumps({'stored_at': time.time(), 'result': result}),
+            ex=ttl
+        )
+    except (redis.RedisError, TypeError) as e:
+        logger.warning("⚠️ Redis cache write failed: %s", e)
+
+
+def prefetch_cached_responses(calls):
+    """Warm the local cache for several (endpoint, param) calls in one Redis round-trip."""
+    _redis_get_many(calls)
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers of the same call wait on."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def _redis_acquire_fetch_lock(key, token):
+    """Claim the cross-process right to fetch key.
+    
+    True when this worker should fetch: the lock was taken, or Redis is not
+    configured or unreachable.
+    """
+    client = _get_redis()
+    if client is None:
+        return True
+    try:
+        return bool(client.set(REDIS_KEY_PREFIX + "lock:" + key, token, nx=True, ex=REDIS_LOCK_TIMEOUT_SECONDS))
+    except redis.RedisError as e:
+        logger.warning("⚠️ Redis lock failed: %s", e)
+        return True
+
+
+def _redis_release_fetch_lock(key, token):
+    client = _get_redis()
+    if client is None:
+        return
+    lock_key = REDIS_KEY_PREFIX + "lock:" + key
+    try:
+        if client.get(lock_key) == token.encode('utf-8'):
+            client.delete(lock_key)
+    except redis.RedisError as e:
+        logger.warning("⚠️ Redis unlock failed: %s", e)
+
+
+def _wait_for_other_worker(key, endpoint, param, ttl):
+    """Poll Redis for a response another worker is fetching.
+    
+    None on timeout, or as soon as the other worker releases its lock
+    without caching a response (its fetch failed or returned an error).
+    """
+    client = _get_redis()
+    lock_key = REDIS_KEY_PREFIX + "lock:" + key
+    deadline = time.monotonic() + REDIS_LOCK_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(REDIS_LOCK_POLL_SECONDS)
+        if _redis_get_many([(endpoint, param)]):
+            return _local_get(key, ttl)
+        try:
+            if client is None or not client.exists(lock_key):
+                # The response is written before the lock is released, so
+                # check once more in case both happened since the read above
+                return _local_get(key, ttl) if _redis_get_many([(endpoint, param)]) else None
+        except redis.RedisError as e:
+            logger.warning("⚠️ Redis lock check failed: %s", e)
+            return None
+    return None
+
+
+def _fetch_single_flight(key, endpoint, param, ttl, fetch):
+    """Run fetch once per key across threads and, with Redis, across workers.
+    
+    Concurrent callers of the same call wait for the first caller's result
+    instead of issuing their own MCP round-trip.
+    """
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    
+    if not leader:
+        flight.done.wait()
+        return flight.result if flight.result is not None else fetch()
+    
+    try:
+        token = f"{os.getpid()}:{threading.get_ident()}:{time.monotonic()}"
+        if _redis_acquire_fetch_lock(key, token):
+            try:
+                flight.result = fetch()
+            finally:
+                _redis_release_fetch_lock(key, token)
+        else:
+            flight.result = _wait_for_other_worker(key, endpoint, param, ttl)
+            if flight.result is None:
+                flight.result = fetch()
+        return flight.result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+
+def _ttl_cached(endpoint):
+    """Serve an endpoint from the response cache while its TTL holds.
+    
+    Lookups try the in-process cache, then Redis when configured. Empty and
+    error responses are kept only in the in-process cache, for at most
+    NEGATIVE_CACHE_TTL_SECONDS. The local cache is module-level so every
+    BrightDataMCP instance shares it.
+    """
+    ttl = CACHE_TTL_SECONDS[endpoint]
+    
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, param):
+            key = _cache_key(endpoint, [param])
+            result = _local_get(key, ttl)
+            if result is None and _redis_get_many([(endpoint, param)]):
+                result = _local_get(key, ttl)
+            with _response_cache_lock:
+                _cache_stats['hits' if result is not None else 'misses'] += 1
+            if result is not None:
+                return result
+            
+            def fetch():
+                result = method(self, param)
+                _local_put(key, result)
+                if not _is_error_response(result):
+                    _redis_put(key, result, ttl)
+                return result
+            
+            return _fetch_single_flight(key, endpoint, param, ttl, fetch)
+        return wrapper
+    return decorator
+
+def _parse_dict_result(client, mcp_result):
+    if 'results' in mcp_result:
+        logger.debug("MCP returned %d results", len(mcp_result['results']))
+        return mcp_result
+    return _parse_json_result(client, mcp_result)
+
+
+def _parse_list_result(client, mcp_result):
+    logger.debug("MCP returned %d results as list", len(mcp_result))
+    return {'results': mcp_result}
+
+
+def _parse_str_result(client, mcp_result):
+    # Sniff without copying: strip()/lower() would duplicate a multi-MB page
+    if _MARKUP_PREFIX_RE.match(mcp_result) or _HTML_MARKER_RE.search(mcp_result):
+        return client._parse_html_search_results(mcp_result)
+    try:
+        parsed = orjson.loads(mcp_result)
+        return parsed if isinstance(parsed, dict) else {'results': [parsed]}
+    except:
+        logger.debug("MCP returned string: %s...", mcp_result[:100])
+        return {'results': []}
+
+
+def _parse_json_result(client, mcp_result):
+    try:
+        parsed = orjson.loads(mcp_result if isinstance(mcp_result, bytes) else str(mcp_result))
+        return parsed if isinstance(parsed, dict) else {'results': [parsed]}
+    except:
+        logger.debug("MCP returned unknown type: %s", type(mcp_result))
+        return {'results': []}
+
+
+# _parse_mcp_results handlers keyed by the exact result type; anything else
+# is read as JSON text
+_PARSE_HANDLERS = {
+    dict: _parse_dict_result,
+    list: _parse_list_result,
+    str: _parse_str_result,
+    bytes: _parse_json_result,
+}
+
+
+def _parse_handler_for_subclass(result_type):
+    """Handler for a subclass of a dispatched type, else the JSON fallback."""
+    for base in result_type.__mro__[1:]:
+        if base in _PARSE_HANDLERS:
+            return _PARSE_HANDLERS[base]
+    return _parse_json_result
+
+
 class BrightDataMCP:
     def __init__(self):
         """Initialize BrightData client with MCP integration."""
@@ -21,8 +498,15 @@ class BrightDataMCP:
                 "BROWSER_ZONE": os.getenv("BROWSER_ZONE", "scraping_browser1"),
             },
         )
-        print("✅ BrightData MCP client initialized")
+        # One MCP server subprocess per client, started on the first search
+        # and restarted after the session breaks
+        self._adapt = None
+        self._search_tools = None
+        self._start_lock = threading.Lock()
+        self._close_registered = False
+        logger.info("✅ BrightData MCP client initialized")
     
+    @_ttl_cached('scrape_company_linkedin')
     def scrape_company_linkedin(self, company_name):
         """Scrape LinkedIn for hiring activity and posts using Bright Data MCP."""
         try:
@@ -30,15 +514,17 @@ class BrightDataMCP:
             search_result = self._mcp_search(query)
             
             if search_result and search_result.get('results'):
-                linkedin_url = f"https://linkedin.com/company/{company_name.lower().replace(' ', '-').replace('systems', '').replace('solutions', '').replace('corp', '').strip('-')}"
+                slug = _LINKEDIN_SLUG_STRIP_RE.sub('', company_name.lower()).translate(_LINKEDIN_SLUG_TRANS).strip('-')
+                linkedin_url = f"https://linkedin.com/company/{slug}"
                 return self._parse_linkedin_search_results(search_result['results'], linkedin_url)
             else:
                 return {"error": "No LinkedIn data found", "source": "brightdata_mcp"}
                 
         except Exception as e:
-            print(f"Error scraping LinkedIn for {company_name}: {str(e)}")
+            logger.error("Error scraping LinkedIn for %s: %s", company_name, e)
             return {"error": str(e), "source": "brightdata_mcp"}
     
+    @_ttl_cached('scrape_company_website')
     def scrape_company_website(self, domain):
         """Extract company info from website using Bright Data MCP."""
         if not domain:
@@ -55,9 +541,10 @@ class BrightDataMCP:
                 return {"error": "No website data found", "source": "brightdata_mcp"}
                 
         except Exception as e:
-            print(f"Error scraping website {domain}: {str(e)}")
+            logger.error("Error scraping website %s: %s", domain, e)
             return {"error": str(e), "source": "brightdata_mcp"}
     
+    @_ttl_cached('search_funding_news')
     def search_funding_news(self, company_name):
         """Search for funding announcements using MCP search."""
         try:
@@ -75,9 +562,10 @@ class BrightDataMCP:
                 return {"query": query, "results": [], "source": "brightdata_mcp"}
                 
         except Exception as e:
-            print(f"Error searching funding news for {company_name}: {str(e)}")
+            logger.error("Error searching funding news for %s: %s", company_name, e)
             return {"error": str(e), "source": "brightdata_mcp"}
     
+    @_ttl_cached('search_company_news')
     def search_company_news(self, company_name):
         """Search for recent company news using MCP search."""
         try:
@@ -94,133 +582,221 @@ class BrightDataMCP:
                 return {"query": query, "results": [], "source": "brightdata_mcp"}
                 
         except Exception as e:
-            print(f"Error searching company news for {company_name}: {str(e)}")
+            logger.error("Error searching company news for %s: %s", company_name, e)
             return {"error": str(e), "source": "brightdata_mcp"}
     
+    async def scrape_company_linkedin_async(self, company_name):
+        """scrape_company_linkedin in a worker thread, for use from async code."""
+        return await asyncio.to_thread(self.scrape_company_linkedin, company_name)
+    
+    async def scrape_company_website_async(self, domain):
+        """scrape_company_website in a worker thread, for use from async code."""
+        return await asyncio.to_thread(self.scrape_company_website, domain)
+    
+    async def search_funding_news_async(self, company_name):
+        """search_funding_news in a worker thread, for use from async code."""
+        return await asyncio.to_thread(self.search_funding_news, company_name)
+    
+    async def search_company_news_async(self, company_name):
+        """search_company_news in a worker thread, for use from async code."""
+        return await asyncio.to_thread(self.search_company_news, company_name)
+    
+    async def enrich_company(self, company_name, domain=None):
+        """Fetch LinkedIn, website, funding and news data for one company concurrently."""
+        await asyncio.to_thread(prefetch_cached_responses, [
+            ('scrape_company_linkedin', company_name),
+            ('scrape_company_website', domain),
+            ('search_funding_news', company_name),
+            ('search_company_news', company_name)
+        ])
+        linkedin, website, funding, news = await asyncio.gather(
+            self.scrape_company_linkedin_async(company_name),
+            self.scrape_company_website_async(domain),
+            self.search_funding_news_async(company_name),
+            self.search_company_news_async(company_name)
+        )
+        return {
+            "linkedin": linkedin,
+            "website": website,
+            "funding_news": funding,
+            "company_news": news
+        }
+    
+    async def enrich_companies(self, companies, max_concurrency=MAX_ENRICH_CONCURRENCY):
+        """Enrich company dicts (name and optional domain), a bounded number at a time.
+        
+        Results are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def enrich(company):
+            async with semaphore:
+                return await self.enrich_company(company.get('name', ''), company.get('domain'))
+        
+        return await asyncio.gather(*(enrich(company) for company in companies))
+    
+    def search_company_news_batch(self, queries):
+        """Run several company news searches concurrently, keyed by query."""
+        unique_queries = list(dict.fromkeys(queries))
+        if not unique_queries:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_BATCH_WORKERS, len(unique_queries))) as executor:
+            return dict(zip(unique_queries, executor.map(self.search_company_news, unique_queries)))
+    
+    def _ensure_started(self):
+        """Start the MCP server on first use and keep its session open.
+        
+        Returns the usable tools as (call, name, kind) tuples in server order,
+        where call is the tool's resolved entry point and kind is 'search'
+        or 'scrape'.
+        """
+        if self._search_tools is not None:
+            return self._search_tools
+        with self._start_lock:
+            if self._search_tools is None:
+                adapt = MCPAdapt(self.server_params, CrewAIAdapter())
+                mcp_tools = adapt.__enter__()
+                self._adapt = adapt
+                if not self._close_registered:
+                    atexit.register(self.close)
+                    self._close_registered = True
+                self._search_tools = self._classify_tools(mcp_tools or [])
+        return self._search_tools
+    
+    def _classify_tools(self, mcp_tools):
+        """Keep the tools _mcp_search can use, with their entry points resolved once."""
+        search_tools = []
+        for tool in mcp_tools:
+            tool_name = getattr(tool, 'name', str(tool))
+            call = getattr(tool, '_run', None) or getattr(tool, 'run', None)
+            if 'search_engine' in tool_name and 'batch' not in tool_name:
+                call = call or (tool if callable(tool) else getattr(tool, 'search_engine', None))
+                kind = 'search'
+            elif any(keyword in tool_name.lower() for keyword in ['scrape', 'web', 'browser']):
+                kind = 'scrape'
+            else:
+                continue
+            
+            if call is None:
+                logger.warning("⚠️ MCP tool %s has no callable entry point, skipping", tool_name)
+                continue
+            search_tools.append((call, tool_name, kind))
+        return search_tools
+    
+    def close(self):
+        """Shut down the MCP server session, if one was started."""
+        with self._start_lock:
+            adapt, self._adapt, self._search_tools = self._adapt, None, None
+        if adapt is not None:
+            adapt.__exit__(None, None, None)
+    
+    def _reset_session(self, broken_tools):
+        """Drop a session whose transport failed so the next search restarts the server.
+        
+        Only the session that handed out broken_tools is closed, so a session
+        another thread already restarted is left alone.
+        """
+        with self._start_lock:
+            if self._search_tools is not broken_tools:
+                return
+            adapt, self._adapt, self._search_tools = self._adapt, None, None
+        if adapt is not None:
+            try:
+                adapt.__exit__(None, None, None)
+            except Exception as e:
+                logger.warning("⚠️ Error closing broken MCP session: %s", e)
+    
     def _mcp_search(self, query, num_results=10):
         """Execute search using MCP tools - based on your example."""
-        with MCPAdapt(self.server_params, CrewAIAdapter()) as mcp_tools:
-            try:
-                if not mcp_tools:
-                    print("⚠️ No MCP tools available")
-                    return {'results': []}
+        search_tools = self._ensure_started()
+        try:
+            if not search_tools:
+                logger.warning("⚠️ No MCP tools available")
+                return {'results': []}
+            
+            for call, tool_name, kind in search_tools:
+                logger.debug("Trying MCP tool: %s", tool_name)
                 
-                for tool in mcp_tools:
+                if kind == 'search':
                     try:
-                        tool_name = getattr(tool, 'name', str(tool))
-                        print(f"🔍 Trying MCP tool: {tool_name}")
+                        result = call(query=query, engine="google")
                         
-                        if 'search_engine' in tool_name and 'batch' not in tool_name:
-                            try:
-                                if hasattr(tool, '_run'):
-                                    result = tool._run(query=query, engine="google")
-                                elif hasattr(tool, 'run'):
-                                    result = tool.run(query=query, engine="google")
-                                elif hasattr(tool, '__call__'):
-                                    result = tool(query=query, engine="google")
-                                else:
-                                    result = tool.search_engine(query=query, engine="google")
-                                
-                                if result:
-                                    return self._parse_mcp_results(result)
-                            except Exception as method_error:
-                                print(f"⚠️ Method failed for {tool_name}: {str(method_error)}")
-                                continue
-                        
-                        elif any(keyword in tool_name.lower() for keyword in ['scrape', 'web', 'browser']):
-                            try:
-                                if hasattr(tool, '_run'):
-                                    result = tool._run(url=f"https://www.google.com/search?q={query}")
-                                elif hasattr(tool, 'run'):
-                                    result = tool.run(url=f"https://www.google.com/search?q={query}")
-                                
-                                if result:
-                                    return self._parse_mcp_results(result)
-                            except Exception as method_error:
-                                print(f"⚠️ Scrape method failed for {tool_name}: {str(method_error)}")
-                                continue
-                        
-                    except Exception as tool_error:
-                        print(f"⚠️ Tool {tool_name} failed: {str(tool_error)}")
+                        if result:
+                            return self._parse_mcp_results(result)
+                    except _MCP_TRANSPORT_ERRORS as transport_error:
+                        return self._on_transport_error(search_tools, tool_name, transport_error)
+                    except Exception as method_error:
+                        logger.warning("⚠️ Method failed for %s: %s", tool_name, method_error)
                         continue
                 
-                print(f"⚠️ No MCP tool could process: {query}")
-                return {'results': []}
-                
-            except Exception as e:
-                print(f"❌ MCP scraping failed: {str(e)}")
-                return {'results': []}
+                else:
+                    try:
+                        result = call(url=GOOGLE_SEARCH_URL + quote_plus(query))
+                        
+                        if result:
+                            return self._parse_mcp_results(result)
+                    except _MCP_TRANSPORT_ERRORS as transport_error:
+                        return self._on_transport_error(search_tools, tool_name, transport_error)
+                    except Exception as method_error:
+                        logger.warning("⚠️ Scrape method failed for %s: %s", tool_name, method_error)
+                        continue
+            
+            logger.warning("⚠️ No MCP tool could process: %s", query)
+            return {'results': []}
+            
+        except Exception as e:
+            logger.error("❌ MCP scraping failed: %s", e)
+            return {'results': []}
+    
+    def _on_transport_error(self, search_tools, tool_name, error):
+        """Restart the MCP server on the next search; the remaining tools share the broken session."""
+        logger.warning("⚠️ MCP session failed in %s, restarting the server on the next search: %s", tool_name, error)
+        self._reset_session(search_tools)
+        return {'results': []}
     
     def _parse_mcp_results(self, mcp_result):
         """Parse MCP tool results into expected format."""
         try:
-            if isinstance(mcp_result, dict) and 'results' in mcp_result:
-                print(f"🔍 MCP returned {len(mcp_result['results'])} results")
-                return mcp_result
-            elif isinstance(mcp_result, list):
-                print(f"🔍 MCP returned {len(mcp_result)} results as list")
-                return {'results': mcp_result}
-            elif isinstance(mcp_result, str):
-                if mcp_result.strip().startswith('<') or 'html' in mcp_result.lower():
-                    return self._parse_html_search_results(mcp_result)
-                else:
-                    try:
-                        parsed = json.loads(mcp_result)
-                        return parsed if isinstance(parsed, dict) else {'results': [parsed]}
-                    except:
-                        print(f"🔍 MCP returned string: {mcp_result[:100]}...")
-                        return {'results': []}
-            else:
-                try:
-                    parsed = json.loads(str(mcp_result))
-                    return parsed if isinstance(parsed, dict) else {'results': [parsed]}
-                except:
-                    print(f"🔍 MCP returned unknown type: {type(mcp_result)}")
-                    return {'results': []}
+            handler = _PARSE_HANDLERS.get(type(mcp_result))
+            if handler is None:
+                handler = _parse_handler_for_subclass(type(mcp_result))
+            return handler(self, mcp_result)
         except Exception as e:
-            print(f"⚠️ Error parsing MCP results: {str(e)}")
+            logger.warning("⚠️ Error parsing MCP results: %s", e)
             return {'results': []}
     
     def _parse_html_search_results(self, html_content):
         """Parse HTML search results page to extract search results."""
-        from bs4 import BeautifulSoup
-        import re
-        
         results = []
         
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            all_links = soup.find_all('a', href=True)
-            
-            for link in all_links:
+            for link in self._iter_html_links(html_content):
                 try:
-                    url = link.get('href', '')
+                    url = link.get('href')
+                    if url is None:
+                        continue
                     
                     if not url.startswith('http'):
                         continue
                         
-                    if any(skip in url for skip in [
-                        'google.com', 'accounts.google', 'support.google',
-                        '/search?', 'javascript:', '#', 'mailto:', 'webcache',
-                        'youtube.com/redirect', 'translate.google'
-                    ]):
+                    if _is_serp_chrome_link(url):
                         continue
                     
-                    title_elem = link.find(['h3', 'h2', 'h1', 'span'])
-                    if title_elem:
-                        title = title_elem.get_text().strip()
+                    title_elems = _LINK_TITLE_XPATH(link)
+                    if title_elems:
+                        title = title_elems[0].text_content().strip()
                     else:
-                        title = link.get_text().strip()
+                        title = link.text_content().strip()
                     
                     if not title or len(title) < 5 or len(title) > 200:
                         continue
                     
                     snippet = ""
-                    parent = link.parent
-                    if parent:
-                        for elem in parent.find_all(['div', 'span', 'p']):
-                            text = elem.get_text().strip()
+                    parent = link.getparent()
+                    if parent is not None:
+                        for elem in _SNIPPET_CANDIDATES_XPATH(parent):
+                            text = elem.text_content().strip()
                             if len(text) > 30 and text != title and 'javascript' not in text.lower():
                                 snippet = text[:200]
                                 break
@@ -241,47 +817,76 @@ class BrightDataMCP:
             if not results:
                 return self._parse_html_with_regex(html_content)
             
-            print(f"🔍 Extracted {len(results)} search results from HTML")
+            logger.debug("Extracted %d search results from HTML", len(results))
             return {'results': results}
             
         except Exception as e:
-            print(f"⚠️ Error parsing HTML search results: {str(e)}")
+            logger.warning("⚠️ Error parsing HTML search results: %s", e)
             return self._parse_html_with_regex(html_content)
     
+    def _iter_html_links(self, html_content):
+        """Yield <a> elements in document order while the page is still being parsed.
+        
+        The page is fed to a pull parser in chunks and each link is released
+        once its parent element has closed, so the parent's full content is
+        available for the snippet lookup. A caller that stops early leaves the
+        rest of the page unparsed.
+        """
+        parser = etree.HTMLPullParser(events=('start', 'end'))
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        open_elements = []
+        pending = deque()
+        
+        def drain_events():
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    open_elements.append(elem)
+                    if elem.tag == 'a':
+                        pending.append(elem)
+                else:
+                    while open_elements and open_elements.pop() is not elem:
+                        pass
+        
+        for offset in range(0, len(html_content), HTML_FEED_CHUNK_SIZE):
+            parser.feed(html_content[offset:offset + HTML_FEED_CHUNK_SIZE])
+            drain_events()
+            while pending:
+                parent = pending[0].getparent()
+                if parent is not None and any(elem is parent for elem in open_elements):
+                    break
+                yield pending.popleft()
+        
+        parser.close()
+        drain_events()
+        yield from pending
+    
     def _parse_html_with_regex(self, html_content):
         """Fallback regex parsing for HTML search results."""
-        import re
-        
         results = []
         
-        url_pattern = r'https?://[^\s<>"]+\.(?:com|org|net|edu|gov|io|co|ai|tech|biz|info)[^\s<>"]*'
-        urls = re.findall(url_pattern, html_content, re.IGNORECASE)
-        
-        for full_match in re.finditer(url_pattern, html_content, re.IGNORECASE):
+        for full_match in _RESULT_URL_RE.finditer(html_content):
             url = full_match.group(0)
             
-            if any(skip in url for skip in [
-                'google.com', 'youtube.com', 'accounts.google',
-                'support.google', 'translate.google'
-            ]):
+            if _REGEX_URL_SKIP_RE.search(url):
                 continue
             
+            # Titles are searched within 500 characters either side of the URL,
+            # in place rather than on a copied slice
             start_pos = max(0, full_match.start() - 500)
             end_pos = min(len(html_content), full_match.end() + 500)
-            surrounding_text = html_content[start_pos:end_pos]
             
-            title_patterns = [
-                r'<h[1-6][^>]*>([^<]+)</h[1-6]>',
-                r'<title[^>]*>([^<]+)</title>',
-                r'>([^<]{10,80})</[^>]*>(?=.*' + re.escape(url[:30]) + ')',
-                r'([A-Z][^|<>{}\[\]]{10,80})(?=.*' + re.escape(url[:20]) + ')'
-            ]
+            title_patterns = (
+                _HEADING_TITLE_RE,
+                _PAGE_TITLE_RE,
+                _element_title_before(url[:30]),
+                _text_title_before(url[:20])
+            )
             
             title = ""
             for title_pattern in title_patterns:
-                title_matches = re.findall(title_pattern, surrounding_text, re.IGNORECASE)
-                if title_matches:
-                    title = title_matches[0].strip()
+                title_match = title_pattern.search(html_content, start_pos, end_pos)
+                if title_match:
+                    title = title_match.group(1).strip()
                     break
             
             if not title:
@@ -299,7 +904,7 @@ class BrightDataMCP:
                 if len(results) >= 10:
                     break
         
-        print(f"🔍 Regex extracted {len(results)} search results")
+        logger.debug("Regex extracted %d search results", len(results))
         return {'results': results}
     
     def _parse_linkedin_search_results(self, results, linkedin_url):
@@ -308,17 +913,18 @@ class BrightDataMCP:
         recent_activity = []
         employee_count = None
         
-        for result in results:
-            title = result.get('title', '').lower()
-            snippet = result.get('snippet', '').lower()
-            
-            if any(keyword in title or keyword in snippet for keyword in ['hiring', 'jobs', 'careers', 'join']):
+        texts = [_result_search_text(result) for result in results]
+        hiring = set(_matching_result_indices(texts, _LINKEDIN_HIRING_RE))
+        activity = set(_matching_result_indices(texts, _LINKEDIN_ACTIVITY_RE))
+        
+        for index, result in enumerate(results):
+            if index in hiring:
                 hiring_posts.append({
                     "title": result.get('title', '')[:100],
                     "source": "linkedin_mcp"
                 })
             
-            if any(keyword in title or keyword in snippet for keyword in ['announces', 'launches', 'proud', 'excited']):
+            if index in activity:
                 recent_activity.append({
                     "type": "company_update",
                     "content": result.get('snippet', '')[:200]
@@ -345,18 +951,10 @@ class BrightDataMCP:
                 description = result.get('snippet', '')[:500]
             
             content = (result.get('title', '') + ' ' + result.get('snippet', '')).lower()
-            tech_keywords = {
-                'react': 'React',
-                'angular': 'Angular', 
-                'vue': 'Vue.js',
-                'node.js': 'Node.js',
-                'python': 'Python',
-                'shopify': 'Shopify',
-                'salesforce': 'Salesforce'
-            }
+            found = {match.group(1) for match in _TECH_KEYWORD_RE.finditer(content)}
             
-            for keyword, tech in tech_keywords.items():
-                if keyword in content and tech not in technologies:
+            for keyword, tech in _TECH_KEYWORDS.items():
+                if keyword in found and tech not in technologies:
                     technologies.append(tech)
         
         return {
@@ -370,17 +968,14 @@ class BrightDataMCP:
     def _filter_funding_results(self, results):
         """Filter results for funding-related content."""
         funding_results = []
-        funding_keywords = ['funding', 'investment', 'series a', 'series b', 'seed', 'raises', 'raised']
+        texts = [_result_search_text(result) for result in results]
         
-        for result in results:
-            title = result.get('title', '').lower()
-            snippet = result.get('snippet', '').lower()
-            
-            if any(keyword in title or keyword in snippet for keyword in funding_keywords):
-                funding_results.append({
-                    "title": result.get('title', '')[:150],
-                    "source": result.get('url', '').split('/')[2] if result.get('url') else "Unknown",
-                    "date": "2024-01-15"
-                })
+        for index in _matching_result_indices(texts, _FUNDING_RE):
+            result = results[index]
+            funding_results.append({
+                "title": result.get('title', '')[:150],
+                "source": result.get('url', '').split('/')[2] if result.get('url') else "Unknown",
+                "date": "2024-01-15"
+            })
         
         return funding_results
\ No newline at end of file
@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from agents.contact_research import ContactResearchTool
+
+
+def test_name_followed_by_capitalised_title_keeps_two_word_name():
+    tool = ContactResearchTool(None)
+    names = tool._extract_names_from_text("Jane Doe Chief Technology Officer")
+    assert names[0] == ["Jane", "Doe"]
+
+
+def test_middle_initial_name():
+    tool = ContactResearchTool(None)
+    assert tool._extract_names_from_text("John A. Smith, CEO") == [["John", "A. Smith"]]